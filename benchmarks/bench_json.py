@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare JSON decoders on mystem output.
+
+``text`` is the old way: decode a record to text, split it into lines and
+parse them with ujson or json. The others parse every record given as bytes
+with the decoder of the same name, as :py:class:`~pymystem3.Mystem` does.
+
+The output is generated (see ``bench_tokens.py``) or read from a file
+with real mystem output, e.g. ``mystem --format json -i -g -d -c corpus.txt out.jsonl``.
+
+Usage::
+
+    python benchmarks/bench_json.py [--lines N] [--output FILE]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import io
+import time
+
+from pymystem3 import Mystem
+from pymystem3.mystem import _JSON_DECODERS
+
+from bench_tokens import make_output
+
+
+def parse_text(output):
+    count = 0
+    for record in output:
+        count += len(Mystem._process_json_output(record.decode('utf-8')))
+    return count
+
+
+def parser(loads):
+    def parse(output):
+        count = 0
+        for record in output:
+            count += len(loads(record))
+        return count
+    return parse
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    args.add_argument('--lines', type=int, default=20000, help="number of lines of generated output")
+    args.add_argument('--output', help="file with mystem JSON output, one line per input line")
+    args.add_argument('--repeat', type=int, default=3, help="number of runs, the best one is reported")
+    args = args.parse_args(argv)
+
+    if args.output:
+        with io.open(args.output, 'rb') as f:
+            output = [line.rstrip(b'\r\n') for line in f if line.strip()]
+    else:
+        output = make_output(args.lines)
+    size = sum(len(r) for r in output)
+    print("%d lines, %d bytes of mystem output" % (len(output), size))
+
+    backends = [('text', parse_text)]
+    backends += [(name, parser(loads)) for name, module, loads in _JSON_DECODERS if module is not None]
+
+    print("%-8s %10s %12s %14s %10s" % ('decoder', 'tokens', 'parse, s', 'tokens/s', 'MB/s'))
+    for name, parse in backends:
+        best = None
+        for _ in range(args.repeat):
+            start = time.time()
+            count = parse(output)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print("%-8s %10d %12.3f %14.0f %10.1f" % (name, count, best, count / best, size / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
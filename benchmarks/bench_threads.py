@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measure how throughput scales with the number of threads, as in a threaded web server.
+
+Every thread handles a stream of short requests (documents of a few lines).
+They share either one :py:class:`~pymystem3.Mystem`, whose calls are served
+one at a time, or a :py:class:`~pymystem3.MystemPool` of as many processes
+as there are threads.
+
+Usage::
+
+    python benchmarks/bench_threads.py                # real mystem
+    python benchmarks/bench_threads.py --fake         # benchmarks/fake_mystem.py
+    python benchmarks/bench_threads.py --fake --threads 1,2,4 --requests 500
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import threading
+import time
+
+from pymystem3 import Mystem, MystemPool
+
+from run import FAKE_MYSTEM, make_text, percentile
+
+
+def bench(analyzer, threads, requests, lines):
+    """ Return requests/s and p99 request latency, in seconds. """
+
+    text = make_text(lines)
+    analyzer.analyze(text)  # warm up
+    latencies = []
+
+    def handle():
+        own = []
+        for _ in range(requests):
+            start = time.time()
+            analyzer.analyze(text)
+            own.append(time.time() - start)
+        latencies.extend(own)
+
+    workers = [threading.Thread(target=handle) for _ in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    return threads * requests / elapsed, percentile(latencies, 99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mystem-bin', help="path to mystem binary (default: as for Mystem())")
+    parser.add_argument('--fake', action='store_true', help="use benchmarks/fake_mystem.py instead of mystem")
+    parser.add_argument('--threads', default='1,2,4,8', help="comma-separated thread counts")
+    parser.add_argument('--requests', type=int, default=200, help="requests per thread")
+    parser.add_argument('--lines', type=int, default=3, help="lines per request")
+    args = parser.parse_args(argv)
+
+    mystem_bin = FAKE_MYSTEM if args.fake else args.mystem_bin
+
+    print("%-8s %-8s %12s %12s" % ('threads', 'mode', 'requests/s', 'p99, ms'))
+    for threads in [int(n) for n in args.threads.split(',')]:
+        for mode in ('shared', 'pool'):
+            if mode == 'shared':
+                analyzer = Mystem(mystem_bin=mystem_bin)
+            else:
+                analyzer = MystemPool(size=threads, mystem_bin=mystem_bin)
+            try:
+                rate, p99 = bench(analyzer, threads, args.requests, args.lines)
+            finally:
+                analyzer.close()
+            print("%-8d %-8s %12.1f %12.1f" % (threads, mode, rate, p99 * 1000))
+
+
+if __name__ == '__main__':
+    main()
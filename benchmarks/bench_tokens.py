@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare parse time and memory of dict tokens and compact tokens.
+
+Mystem output is generated here: lines of words drawn from a Zipfian
+vocabulary, in the same JSON form as ``mystem --format json -i -g -d -c``.
+
+Usage::
+
+    python benchmarks/bench_tokens.py [lines]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import gc
+import json
+import random
+import sys
+import time
+
+from pymystem3 import Mystem
+from pymystem3.tokens import _TokenFactory
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+_GRAMMEMES = ['S,жен,од=им,ед', 'V,несов,пе=прош,ед,изъяв,жен', 'A=им,ед,полн,жен', 'ADV=', 'S,муж,неод=вин,ед']
+
+
+def make_output(lines, words_per_line=12, vocabulary_size=20000, seed=0):
+    """ Return a list of mystem JSON output lines (bytes). """
+
+    rnd = random.Random(seed)
+    vocabulary = []
+    for i in range(vocabulary_size):
+        word = 'слово%d' % i
+        vocabulary.append({'analysis': [{'lex': word, 'gr': rnd.choice(_GRAMMEMES)}], 'text': word})
+    weights = [1.0 / (i + 1) for i in range(vocabulary_size)]
+
+    output = []
+    for _ in range(lines):
+        tokens = []
+        for i in range(words_per_line):
+            if i:
+                tokens.append({'text': ' '})
+            tokens.append(vocabulary[_weighted_choice(rnd, weights)])
+        tokens.append({'text': '\n'})
+        output.append(json.dumps(tokens, ensure_ascii=False).encode('utf-8'))
+    return output
+
+
+def _weighted_choice(rnd, weights, _cumulative={}):
+    key = id(weights)
+    if key not in _cumulative:
+        total = 0.0
+        cumulative = []
+        for w in weights:
+            total += w
+            cumulative.append(total)
+        _cumulative[key] = cumulative
+    cumulative = _cumulative[key]
+    x = rnd.random() * cumulative[-1]
+    lo, hi = 0, len(cumulative) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cumulative[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def parse_dicts(output):
+    result = []
+    for record in output:
+        result.extend(Mystem._process_json_output(record.decode('utf-8')))
+    return result
+
+
+def parse_compact(output):
+    factory = _TokenFactory()
+    result = []
+    for record in output:
+        result.extend(factory.tokens(Mystem._process_json_output(record.decode('utf-8'))))
+    return result
+
+
+def measure(func, output):
+    """ Return number of tokens, parse time and memory taken by the tokens. """
+
+    gc.collect()
+    start = time.time()
+    count = len(func(output))
+    elapsed = time.time() - start
+
+    # Tracing slows allocations down a lot, so memory is measured in a separate run.
+    memory = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        result = func(output)  # noqa
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return count, elapsed, memory
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    lines = int(argv[0]) if argv else 20000
+
+    output = make_output(lines)
+    print("%d lines, %d bytes of mystem output" % (lines, sum(len(r) for r in output)))
+    print("%-8s %10s %12s %14s %16s" % ('tokens', 'count', 'parse, s', 'tokens/s', 'memory, bytes'))
+    for name, func in [('dict', parse_dicts), ('compact', parse_compact)]:
+        count, elapsed, memory = measure(func, output)
+        print("%-8s %10d %12.3f %14.0f %16s" % (name, count, elapsed, count / elapsed,
+                                                'n/a' if memory is None else memory))
+
+
+if __name__ == '__main__':
+    main()
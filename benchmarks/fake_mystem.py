@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A stand-in for the mystem binary to run benchmarks offline and in CI.
+
+It understands the options used by :py:class:`pymystem3.Mystem`, reads
+lines from stdin (or from a file given as an argument) and prints one
+output line per input line, flushing after each, like mystem does.
+Words are split with a regular expression, and their "lemmas" are taken
+from a tiny dictionary or are just lower-cased words, so the results are
+only good for measuring the wrapper, not mystem itself.
+
+Use it as ``MYSTEM_BIN=benchmarks/fake_mystem.py``. Set
+:envvar:`FAKE_MYSTEM_STARTUP` to a number of seconds to simulate the
+time mystem needs to load its dictionaries.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import re
+import sys
+import time
+
+_LEMMAS = {
+    'мама': 'мама',
+    'мыла': 'мыть',
+    'раму': 'рама',
+    'красивая': 'красивый',
+    'красиво': 'красиво',
+}
+
+_WORD_RE = re.compile(r'[^\W_]+(?:-[^\W_]+)*', re.UNICODE)
+_CYRILLIC_RE = re.compile('[а-яё]', re.UNICODE | re.IGNORECASE)
+
+
+def parse_args(args):
+    options = {'format': 'text', 'flags': set(), 'files': []}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--format':
+            options['format'] = args.pop(0)
+        elif arg == '--fixlist':
+            args.pop(0)
+        elif arg.startswith('--'):
+            options['flags'].add(arg)
+        elif arg.startswith('-'):
+            options['flags'].update(arg[1:])
+        else:
+            options['files'].append(arg)
+    return options
+
+
+def analyze(line, flags):
+    tokens = []
+    pos = 0
+    for match in _WORD_RE.finditer(line):
+        if match.start() > pos and 'c' in flags:
+            tokens.append({'text': line[pos:match.start()]})
+        word = match.group()
+        if _CYRILLIC_RE.search(word):
+            analysis = {'lex': _LEMMAS.get(word.lower(), word.lower())}
+            if 'i' in flags:
+                analysis['gr'] = 'S,жен,од=им,ед'
+            if '--weight' in flags:
+                analysis['wt'] = 1
+            tokens.append({'analysis': [analysis], 'text': word})
+        else:
+            tokens.append({'analysis': [], 'text': word})
+        pos = match.end()
+
+    if 'c' in flags:
+        if pos < len(line):
+            tokens.append({'text': line[pos:]})
+        tokens.append({'text': '\n'})
+    return tokens
+
+
+def render(tokens, options):
+    if options['format'] == 'json':
+        return json.dumps(tokens, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    out = []
+    for token in tokens:
+        if 'analysis' in token:
+            lex = token['analysis'][0]['lex'] if token['analysis'] else token['text'] + '??'
+            out.append(('' if 'l' in options['flags'] else token['text']) + '{' + lex + '}')
+        else:
+            out.append(token['text'])
+    out = ''.join(out)
+    return out if out.endswith('\n') else out + '\n'
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+    time.sleep(float(os.environ.get('FAKE_MYSTEM_STARTUP', '0')))
+
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+    inp = open(options['files'][0], 'rb') if options['files'] else stdin
+
+    for line in iter(inp.readline, b''):
+        line = line.decode('utf-8').rstrip('\r\n')
+        stdout.write(render(analyze(line, options['flags']), options).encode('utf-8'))
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for pymystem3.
+
+Measures throughput (lines/s, tokens/s), per-call latency (p50, p99),
+startup time and peak memory (of mystem per run, of Python overall) of
+:py:meth:`Mystem.analyze <pymystem3.Mystem.analyze>`,
+:py:meth:`Mystem.lemmatize <pymystem3.Mystem.lemmatize>`,
+:py:meth:`Lemmatizer.lemmatize <pymystem3.Lemmatizer.lemmatize>` and `file_path` mode
+for several sizes of input.
+
+Usage::
+
+    python benchmarks/run.py                      # real mystem
+    python benchmarks/run.py --fake               # benchmarks/fake_mystem.py, no mystem needed
+    python benchmarks/run.py --fake --profiles short,medium --modes analyze
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pymystem3 import Lemmatizer, Mystem
+
+FAKE_MYSTEM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_mystem.py')
+
+#: name: (lines per call, calls)
+PROFILES = {
+    'short': (1, 2000),
+    'medium': (100, 50),
+    'large': (10000, 3),
+}
+
+MODES = ['analyze', 'lemmatize', 'lemmatizer', 'file']
+
+_WORDS = ('мама мыла раму красивая красиво кот сидел на окне и смотрел в сад где '
+          'шумели деревья под ветром а солнце садилось за дальний лес').split()
+
+
+def make_text(lines, words_per_line=12, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(lines):
+        words = [rnd.choice(_WORDS) for _ in range(words_per_line)]
+        out.append(' '.join(words).capitalize() + '.')
+    return '\n'.join(out)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def peak_rss_mb():
+    """ Peak resident set size of this process, in MB. """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def mystem_peak_rss_mb(m):
+    """
+    Peak resident set size of the running mystem process of `m`, in MB, from
+    ``VmHWM`` in ``/proc/<pid>/status``, or None where there is no ``/proc``.
+
+    ``RUSAGE_CHILDREN`` is no good here: a forked child inherits the peak of
+    the parent, so it would report the size of Python rather than of mystem.
+    """
+    proc = m._process.proc
+    if proc is None:
+        return None
+    try:
+        with io.open('/proc/%d/status' % proc.pid, encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def bench_startup(mystem_bin, runs=5):
+    """ Time to start mystem and get the first result, in seconds. """
+    timings = []
+    for _ in range(runs):
+        start = time.time()
+        m = Mystem(mystem_bin=mystem_bin)
+        m.analyze('мама')
+        timings.append(time.time() - start)
+        m.close()
+    return min(timings), percentile(timings, 50)
+
+
+def bench(mystem_bin, mode, profile):
+    lines, calls = PROFILES[profile]
+    text = make_text(lines)
+
+    path = None
+    if mode == 'file':
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with io.open(fd, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    m = Lemmatizer(mystem_bin=mystem_bin) if mode == 'lemmatizer' else Mystem(mystem_bin=mystem_bin)
+    # file mode streams the file through the same running process as other modes
+    m.start()
+    m.lemmatize('мама')  # warm up
+
+    latencies = []
+    tokens = 0
+    mystem_rss = None
+    try:
+        for _ in range(calls):
+            start = time.time()
+            if mode == 'analyze':
+                tokens += len(m.analyze(text))
+            elif mode in ('lemmatize', 'lemmatizer'):
+                tokens += len(m.lemmatize(text))
+            else:
+                tokens += len(m.analyze(file_path=path))
+            latencies.append(time.time() - start)
+        mystem_rss = mystem_peak_rss_mb(m)
+    finally:
+        m.close()
+        if path is not None:
+            os.unlink(path)
+
+    total = sum(latencies)
+    return {
+        'lines/s': lines * calls / total,
+        'tokens/s': tokens / total,
+        'p50, ms': percentile(latencies, 50) * 1000,
+        'p99, ms': percentile(latencies, 99) * 1000,
+        'mystem, MB': mystem_rss,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mystem-bin', help="path to mystem binary (default: as for Mystem())")
+    parser.add_argument('--fake', action='store_true', help="use benchmarks/fake_mystem.py instead of mystem")
+    parser.add_argument('--profiles', default=','.join(sorted(PROFILES)),
+                        help="comma-separated input sizes: %s" % ', '.join(sorted(PROFILES)))
+    parser.add_argument('--modes', default=','.join(MODES), help="comma-separated modes: %s" % ', '.join(MODES))
+    args = parser.parse_args(argv)
+
+    mystem_bin = FAKE_MYSTEM if args.fake else args.mystem_bin
+    profiles = args.profiles.split(',')
+    modes = args.modes.split(',')
+
+    best, median = bench_startup(mystem_bin)
+    print("startup: best %.1f ms, median %.1f ms" % (best * 1000, median * 1000))
+    print()
+
+    columns = ['lines/s', 'tokens/s', 'p50, ms', 'p99, ms', 'mystem, MB']
+    print("%-10s %-8s" % ('mode', 'profile') + ''.join('%12s' % c for c in columns))
+    for mode in modes:
+        for profile in profiles:
+            result = bench(mystem_bin, mode, profile)
+            print("%-10s %-8s" % (mode, profile) +
+                  ''.join('%12s' % ('n/a' if result[c] is None else '%.1f' % result[c]) for c in columns))
+            sys.stdout.flush()
+
+    if resource is not None:
+        print()
+        print("peak RSS of python: %.1f MB" % peak_rss_mb())
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,7 @@ sys.path.append('.')
 from setup import (
     setup_dict, get_project_files, print_success_message,
     print_failure_message, _lint, _test, _test_all,
-    CODE_DIRECTORY, DOCS_DIRECTORY, TESTS_DIRECTORY, PYTEST_FLAGS)
+    CODE_DIRECTORY, DOCS_DIRECTORY, TESTS_DIRECTORY, BENCHMARKS_DIRECTORY, PYTEST_FLAGS)
 
 from paver.easy import options, task, needs, consume_args
 from paver.setuputils import install_distutils_tasks
@@ -99,6 +99,13 @@ def test():
     raise SystemExit(_test())
 
 
+@task
+def bench():
+    """Run the benchmark suite against the fake mystem stand-in."""
+    raise SystemExit(subprocess.call(
+        [sys.executable, os.path.join(BENCHMARKS_DIRECTORY, 'run.py'), '--fake']))
+
+
 @task
 def lint():
     # This refuses to format properly when running `paver help' unless
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import sys
+
 from . import metadata
 
 
@@ -9,5 +11,14 @@ __license__ = metadata.license
 __copyright__ = metadata.copyright
 
 
-from .mystem import (Mystem, autoinstall)  # noqa
+from .mystem import (Mystem, autoinstall, prewarm, shared_process_stats)  # noqa
+from .lemmatizer import Lemmatizer  # noqa
+from .pool import (MystemPool, analyze_file_parallel)  # noqa
+from .cache import (DiskCache, LRUCache)  # noqa
+from .instrumentation import CallStats  # noqa
+from .metrics import (MetricsRegistry, MystemMetrics)  # noqa
+from .tokens import (Analysis, Token)  # noqa
 from .constants import (MYSTEM_BIN, MYSTEM_DIR, MYSTEM_EXE)  # noqa
+
+if sys.version_info >= (3, 5):
+    from .aio import AsyncMystem  # noqa
@@ -1,26 +1,155 @@
 # -*- coding: utf-8 -*-
+"""
+Command line interface for batch jobs::
+
+    python -m pymystem3 [-l] [-j JOBS] [FILE or GLOB ...]
+    python -m pymystem3 serve (--socket PATH | --port PORT) [-j JOBS]
+
+Every input line gets one output line: mystem analysis of the line as compact
+JSON (JSON Lines), or with ``--lemmas`` the line with every word replaced by
+its lemma. Lines are analyzed and written in batches, by several mystem
+processes with ``--jobs``, and the output keeps the input order.
+
+``serve`` runs an analysis daemon, see :py:mod:`pymystem3.server`.
+"""
 
 from __future__ import print_function
 
-import fileinput
+import argparse
+import glob
+import io
 import json
 import sys
+import time
+from itertools import islice
 
+from .lemmatizer import Lemmatizer
 from .mystem import (MYSTEM_BIN, Mystem, autoinstall)
+from .pool import MystemPool
+
+_BATCH_SIZE = 10000
+_PROGRESS_INTERVAL = 1.0
+
+
+def _parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog='python -m pymystem3',
+        description="Analyze lines of texts with mystem. Every input line gets one output line: "
+                    "its analysis as JSON, or with --lemmas the line of lemmas.")
+    parser.add_argument('inputs', nargs='*', metavar='FILE',
+                        help="input files or glob patterns, '-' for stdin (default)")
+    parser.add_argument('-l', '--lemmas', action='store_true', help="print lemmas instead of analysis")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of mystem processes (default: 1)")
+    parser.add_argument('-b', '--batch-size', type=int, default=_BATCH_SIZE,
+                        help="number of lines analyzed and written at once (default: %d)" % _BATCH_SIZE)
+    parser.add_argument('--mystem-bin', help="path to mystem binary")
+    parser.add_argument('-q', '--quiet', action='store_true', help="do not print progress and summary to stderr")
+
+    options = parser.parse_args(args)
+    if options.jobs < 1:
+        parser.error("--jobs must be positive")
+    if options.batch_size < 1:
+        parser.error("--batch-size must be positive")
+
+    paths = []
+    for pattern in options.inputs:
+        matched = [pattern] if pattern == '-' else sorted(glob.glob(pattern))
+        if not matched:
+            parser.error("no such file: %s" % pattern)
+        paths.extend(matched)
+    options.paths = paths
+    return options
+
+
+def _read_lines(paths):
+    for path in paths or ['-']:
+        if path == '-':
+            f = io.open(sys.stdin.fileno(), encoding='utf-8', closefd=False)
+        else:
+            f = io.open(path, encoding='utf-8')
+        with f:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+
+def _format_analysis(tokens):
+    return json.dumps(tokens, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def _format_lemmas(lemmas):
+    line = ''.join(lemmas)
+    return line if line.endswith('\n') else line + '\n'
+
+
+class _Progress(object):
+
+    """
+    Progress and throughput report on stderr.
+    """
+
+    def __init__(self, quiet):
+        self.quiet = quiet
+        self.lines = 0
+        self.tokens = 0
+        self.start = self.reported = time.time()
+        self.tty = sys.stderr.isatty()
+
+    def update(self, lines, tokens):
+        self.lines += lines
+        self.tokens += tokens
+        now = time.time()
+        if not self.quiet and self.tty and now - self.reported >= _PROGRESS_INTERVAL:
+            self.reported = now
+            sys.stderr.write("\r%d lines, %.0f lines/s" % (self.lines, self.lines / (now - self.start)))
+            sys.stderr.flush()
+
+    def summary(self):
+        if self.quiet:
+            return
+        elapsed = max(time.time() - self.start, 1e-9)
+        if self.tty:
+            sys.stderr.write("\r")
+        print("%d lines, %d tokens in %.2f s: %.0f lines/s, %.0f tokens/s" %
+              (self.lines, self.tokens, elapsed, self.lines / elapsed, self.tokens / elapsed), file=sys.stderr)
 
 
 def main(args=None):
-    autoinstall(sys.stderr)
+    args = sys.argv[1:] if args is None else args
+    if args[:1] == ['serve']:
+        from .server import main as serve
+        return serve(args[1:])
 
-    print("mystem is placed in %s" % MYSTEM_BIN, file=sys.stderr)
+    options = _parse_args(args)
 
-    if sys.stdin.isatty():
+    if not options.paths and sys.stdin.isatty():
+        autoinstall(sys.stderr)
+        print("mystem is placed in %s" % MYSTEM_BIN, file=sys.stderr)
         return
 
-    mystem = Mystem()
-    for line in fileinput.input():
-        info = mystem.analyze(line.strip())
-        print(json.dumps(info, ensure_ascii=False, indent=4), file=sys.stdout)
+    mystem_class = Lemmatizer if options.lemmas else Mystem
+    if options.jobs > 1:
+        analyzer = MystemPool(size=options.jobs, mystem_class=mystem_class, mystem_bin=options.mystem_bin)
+    else:
+        analyzer = mystem_class(mystem_bin=options.mystem_bin)
+    # input lines are split already, they must not be split again at \x0c, \u2028 and such
+    method = 'lemmatize_many' if options.lemmas else 'analyze_many'
+    format_line = _format_lemmas if options.lemmas else _format_analysis
+
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    progress = _Progress(options.quiet)
+    lines = _read_lines(options.paths)
+    try:
+        batch = list(islice(lines, options.batch_size))
+        while batch:
+            results = analyzer._analyze_as_lines(batch, method)
+            out.write(''.join(format_line(result) for result in results).encode('utf-8'))
+            out.flush()
+            progress.update(len(batch), sum(len(result) for result in results))
+            batch = list(islice(lines, options.batch_size))
+    finally:
+        analyzer.close()
+    progress.summary()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+An asyncio client for mystem.
+
+.. note:: This module requires Python 3.5+.
+"""
+
+import asyncio
+import collections
+
+from .mystem import (_CHUNK_SIZE, _NL, Mystem, _get_json_decoder, _get_mystem_args, _get_mystem_bin,
+                     _OutputBuffer)
+
+
+class _Request(object):
+
+    """
+    A request waiting for `pending` more lines of mystem output.
+    """
+
+    __slots__ = ('future', 'pending', 'result')
+
+    def __init__(self, future, pending):
+        self.future = future
+        self.pending = pending
+        self.result = []
+
+
+class AsyncMystem(object):
+
+    """
+    Wrap mystem binary to be able to use it from asyncio code.
+
+    A single mystem process is shared by all callers. Requests are written
+    to its stdin in the order they come, and a background task reads stdout
+    and hands the responses back in the same order, so many coroutines may
+    call :py:meth:`analyze` at the same time without blocking the event loop.
+
+    :param  mystem_bin: path to mystem binary
+    :type   mystem_bin: str
+    :param  json_decoder: JSON decoder, as for :py:class:`~pymystem3.mystem.Mystem`
+    :type   json_decoder: str or callable
+
+    All other keyword arguments are the same as for :py:class:`~pymystem3.mystem.Mystem`.
+    """
+
+    def __init__(self, mystem_bin=None, json_decoder=None, **options):
+        self._mystem_bin = _get_mystem_bin(mystem_bin)
+        self._mystemargs = _get_mystem_args(**options)
+        self._json_loads = json_decoder if callable(json_decoder) else _get_json_decoder(json_decoder)
+
+        self._proc = None
+        self._reader = None
+        self._requests = None
+        self._start_lock = None
+        self._write_lock = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        """
+        Run mystem binary.
+
+        .. note:: It is not mandatory to call it. Use it if you want to avoid waiting for mystem loads.
+        """
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self._proc is not None:
+                return
+            self._proc = await asyncio.create_subprocess_exec(
+                self._mystem_bin, *self._mystemargs,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE)
+            self._requests = collections.deque()
+            self._reader = asyncio.ensure_future(self._read_responses(self._proc, self._requests))
+
+    async def close(self):
+        """ Terminate mystem process. """
+
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+
+        if proc.returncode is None:
+            proc.terminate()
+        await proc.wait()
+        await self._reader
+        self._reader = None
+
+    async def analyze(self, text):
+        """
+        Make morphology analysis for a text.
+
+        :type   text:   str
+        :param  text:   text to analyze
+        :returns:       result of morphology analysis.
+        :rtype:         list
+        """
+
+        lines = text.splitlines()
+        if not lines:
+            return []
+
+        payload = _NL.join(line.encode('utf-8') for line in lines) + _NL
+        request = _Request(asyncio.get_event_loop().create_future(), len(lines))
+
+        if self._proc is None:
+            await self.start()
+
+        # Whole requests are written under the lock, so they are never interleaved
+        # and the order of self._requests is the order of the input.
+        async with self._write_lock:
+            if self._proc is None:
+                await self.start()
+            requests = self._requests
+            requests.append(request)
+            try:
+                self._proc.stdin.write(payload)
+            except BaseException:
+                requests.remove(request)
+                raise
+            # Once written, the request will be answered by mystem and must stay
+            # in the queue even if drain fails or is cancelled; if the pipe is broken,
+            # the reader fails all pending requests.
+            await self._proc.stdin.drain()
+
+        return await request.future
+
+    async def lemmatize(self, text):
+        """
+        Make morphology analysis for a text and return list of lemmas.
+
+        :type   text:   str
+        :param  text:   text to analyze
+        :returns:       list of lemmas
+        :rtype:         list
+        """
+
+        infos = await self.analyze(text)
+        return [lemma for lemma in map(Mystem._get_lemma, infos) if lemma]
+
+    async def _read_responses(self, proc, requests):
+        """
+        Read mystem output and resolve requests, one JSON line per input line.
+        """
+
+        output = _OutputBuffer()
+        try:
+            while True:
+                out = await proc.stdout.read(_CHUNK_SIZE)
+                if not out:
+                    break
+
+                for record in output.feed(out):
+                    request = requests[0]
+                    request.result.extend(self._json_loads(record))
+                    request.pending -= 1
+                    if not request.pending:
+                        requests.popleft()
+                        if not request.future.done():
+                            request.future.set_result(request.result)
+        finally:
+            if self._proc is proc:
+                self._proc = None
+            while requests:
+                request = requests.popleft()
+                if not request.future.done():
+                    request.future.set_exception(BrokenPipeError("mystem has closed its output"))
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Caches of mystem analysis results.
+
+A cache maps a key, which is a ``(mystem options, line)`` tuple, to the raw
+mystem output for the line. The output is parsed again on every hit, so each
+caller gets its own copy of tokens and may change them freely.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """
+    In-memory cache which evicts least recently used lines.
+
+    The cache is thread-safe and may be shared by several
+    :py:class:`~pymystem3.mystem.Mystem` instances, even with different
+    options: they are a part of the key.
+
+    :param  max_entries: maximum number of cached lines
+    :type   max_entries: int
+    :param  max_bytes: maximum total size of cached lines and mystem output for them
+    :type   max_bytes: int
+
+    At least one of the limits must be set.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("Either max_entries or max_bytes must be set")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """ Return cached value for key or None. """
+
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Add value for key to the cache, evicting old entries if needed. """
+
+        size = len(key[-1]) + len(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(key[-1]) + len(old)
+            self._data[key] = value
+            self.size += size
+
+            while ((self.max_entries is not None and len(self._data) > self.max_entries) or
+                   (self.max_bytes is not None and self.size > self.max_bytes)):
+                old_key, old = self._data.popitem(last=False)
+                self.size -= len(old_key[-1]) + len(old)
+                self.evictions += 1
+
+    def clear(self):
+        """ Remove all entries. Counters are kept. """
+
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return a snapshot of cache counters.
+
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'bytes': self.size,
+            }
+
+
+class DiskCache(object):
+
+    """
+    Persistent cache in an sqlite database, which evicts least recently used lines.
+
+    The database may be shared by many threads and processes, e.g. by workers
+    of a job, and it is kept between runs, so repeated jobs mostly skip mystem.
+    Keys are stored as hashes of mystem options and lines.
+
+    Limits are checked on every `evict_every` puts by the cache instance,
+    so the database may temporarily exceed them a bit.
+
+    A hit does not write to the database: access times older than
+    `atime_resolution` seconds are collected and written in one transaction
+    for every `evict_every` of them, before eviction and on :py:meth:`close`.
+    So recency is only as precise as `atime_resolution`, and entries hit by
+    other processes may look a bit older to this one until they flush.
+
+    :param  path: path to the database file, created if it does not exist
+    :type   path: str
+    :param  max_entries: maximum number of cached lines
+    :type   max_entries: int
+    :param  max_bytes: maximum total size of mystem output for cached lines
+    :type   max_bytes: int
+    :param  evict_every: number of puts between checks of the limits, and of access times to write at once
+    :type   evict_every: int
+    :param  atime_resolution: how old the access time of an entry has to be to be updated on a hit, in seconds
+    :type   atime_resolution: float
+    :param  timeout: how long to wait for a lock held by another process, in seconds
+    :type   timeout: float
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None, evict_every=256, timeout=30, atime_resolution=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.timeout = timeout
+        self.atime_resolution = atime_resolution
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._puts = 0
+        self._atimes = {}
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS lines ("
+                             "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                             "size INTEGER NOT NULL, atime REAL NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS lines_atime ON lines (atime)")
+
+    def _connect(self):
+        # a connection must not be used by a forked child, it opens its own
+        if self._conn is None or self._pid != os.getpid():
+            # access times collected by the parent are its own to write
+            self._atimes = {}
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _hash(key):
+        prefix, line = key
+        digest = hashlib.sha1()
+        for arg in prefix:
+            if not isinstance(arg, bytes):
+                arg = arg.encode('utf-8')
+            digest.update(arg)
+            digest.update(b'\0')
+        digest.update(line)
+        return digest.hexdigest()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM lines").fetchone()[0]
+
+    def get(self, key):
+        """ Return cached value for key or None. """
+
+        h = self._hash(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, atime FROM lines WHERE key = ?", (h,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] >= self.atime_resolution:
+                self._atimes[h] = now
+                if len(self._atimes) >= self.evict_every:
+                    self._flush_atimes(conn)
+            self.hits += 1
+            return row[0].encode('utf-8')
+
+    def _flush_atimes(self, conn):
+        if self._atimes:
+            with conn:
+                conn.executemany("UPDATE lines SET atime = ? WHERE key = ?",
+                                 [(atime, h) for h, atime in self._atimes.items()])
+            self._atimes = {}
+
+    def put(self, key, value):
+        """ Add value for key to the cache, evicting old entries if needed. """
+
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+
+        h = self._hash(key)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO lines (key, value, size, atime) VALUES (?, ?, ?, ?)",
+                             (h, value.decode('utf-8'), len(value), time.time()))
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict(conn)
+
+    def evict(self):
+        """ Evict least recently used entries until the cache fits in its limits. """
+
+        with self._lock:
+            self._evict(self._connect())
+
+    def _evict(self, conn):
+        self._flush_atimes(conn)
+        with conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM lines").fetchone()
+            excess = 0
+            if self.max_entries is not None:
+                excess = max(excess, count - self.max_entries)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # find how many oldest entries have to go to free enough bytes
+                freed = 0
+                n = 0
+                for (entry_size,) in conn.execute("SELECT size FROM lines ORDER BY atime"):
+                    if size - freed <= self.max_bytes:
+                        break
+                    freed += entry_size
+                    n += 1
+                excess = max(excess, n)
+            if excess > 0:
+                conn.execute("DELETE FROM lines WHERE key IN "
+                             "(SELECT key FROM lines ORDER BY atime LIMIT ?)", (excess,))
+                self.evictions += excess
+
+    def clear(self):
+        """ Remove all entries. Counters are kept. """
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM lines")
+            self._atimes = {}
+
+    def close(self):
+        """ Write collected access times and close the database connection. It is opened again on next use. """
+
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._flush_atimes(self._conn)
+                self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        """
+        Return a snapshot of cache counters.
+        Hits, misses and evictions are counted by this instance only.
+
+        :rtype: dict
+        """
+
+        with self._lock:
+            count, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM lines").fetchone()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': count,
+                'bytes': size,
+            }
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of mystem calls: where the time of a call goes and how much data it moves.
+
+Enable it with ``Mystem(instrument=True)`` and read totals with
+:py:meth:`Mystem.stats <pymystem3.mystem.Mystem.stats>`, or pass ``on_call``
+to get :py:class:`CallStats` of every call as soon as it is done::
+
+    m = Mystem(on_call=lambda call: log.info("%r", call.as_dict()))
+
+The time of a call is split into writing input to mystem, waiting for
+mystem in :py:func:`select.select`, reading its output and parsing it.
+The rest of the total time is spent by mystem while we are busy with
+something else, and in Python code around, e.g. building the result.
+The split, bytes and cache hits are recorded where mystem is pipelined
+(see :py:class:`~pymystem3.mystem._InstrumentedPipeline`); elsewhere, e.g. on
+Windows, only lines, tokens and the total time are.
+"""
+
+import threading
+import time
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class CallStats(object):
+
+    """
+    Counters and timings of one call, times are in seconds.
+
+    `method` is ``analyze``, ``analyze_many`` or ``iter_analyze``, the lemmatize methods
+    are counted as the analyze methods they use. `restarts` is the number of times
+    mystem died during the call and was restarted.
+    For ``iter_analyze`` the total time includes the time the caller takes between items.
+    """
+
+    __slots__ = ('method', 'lines', 'tokens', 'bytes_in', 'bytes_out', 'cache_hits', 'restarts',
+                 'write_time', 'wait_time', 'read_time', 'parse_time', 'total_time')
+
+    #: fields summed up by :py:meth:`Mystem.stats <pymystem3.mystem.Mystem.stats>`
+    counters = __slots__[1:]
+
+    def __init__(self, method):
+        self.method = method
+        for name in self.counters:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        result = dict((name, getattr(self, name)) for name in self.counters)
+        result['method'] = self.method
+        return result
+
+    def __repr__(self):
+        return 'CallStats(%s)' % ', '.join('%s=%r' % item for item in sorted(self.as_dict().items()))
+
+
+class _Instrumentation(object):
+
+    """
+    Totals of all calls of an instance, and the callback to pass every call to.
+    """
+
+    def __init__(self, on_call=None):
+        self._lock = threading.Lock()
+        self._totals = dict((name, 0) for name in CallStats.counters)
+        self._calls = 0
+        self.on_call = on_call
+
+    def record(self, call):
+        with self._lock:
+            self._calls += 1
+            totals = self._totals
+            for name in CallStats.counters:
+                totals[name] += getattr(call, name)
+        if self.on_call is not None:
+            self.on_call(call)
+
+    def snapshot(self):
+        with self._lock:
+            result = dict(self._totals)
+            result['calls'] = self._calls
+        return result
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+A fast lemmatizer which uses plain text output of mystem instead of JSON.
+
+With ``-c -l`` mystem prints only the lemma of every word in braces and
+copies everything else from input, e.g. ``{мама} {мыть} {рама}.``, so
+there is no grammatical information to produce, transfer and decode.
+Braces of the input can not be told from the braces of lemmas in this
+output, so lines with braces are lemmatized from JSON output instead.
+"""
+
+import re
+import sys
+
+from .mystem import (_MAX_INFLIGHT, _NL_TEXT, _WORD_RE, Mystem, _BaseMystem, _decode_utf8)
+
+
+_OUTPUT_RE = re.compile(r'\{([^{}]*)\}|[^{]+|\{', re.UNICODE)
+
+
+def _parse_lemmas(line):
+    """
+    Parse a line of mystem text output into a list of lemmas and separators,
+    in the same form as :py:meth:`Mystem.lemmatize <pymystem3.mystem.Mystem.lemmatize>` returns.
+
+    A lemma has ``?`` appended for a non-dictionary word, and ``??`` for an unknown one,
+    e.g. a word in latin letters. Words which mystem did not analyze at all are printed
+    as is, so they are split from separators here.
+    """
+
+    lemmas = []
+    for match in _OUTPUT_RE.finditer(line):
+        lemma = match.group(1)
+        if lemma is not None:
+            lemma = lemma.split('|', 1)[0].rstrip('?')
+            if lemma:
+                lemmas.append(lemma)
+            continue
+
+        text = match.group()
+        pos = 0
+        for word in _WORD_RE.finditer(text):
+            if word.start() > pos:
+                lemmas.append(text[pos:word.start()])
+            lemmas.append(word.group())
+            pos = word.end()
+        if pos < len(text):
+            lemmas.append(text[pos:])
+    lemmas.append(_NL_TEXT)
+    return lemmas
+
+
+def _has_braces(line):
+    if isinstance(line, unicode):
+        return u'{' in line or u'}' in line
+    return b'{' in line or b'}' in line
+
+
+class Lemmatizer(_BaseMystem):
+
+    """
+    Lemmatizer which runs mystem with ``-c -l`` in text format.
+
+    It gives the same results as :py:meth:`Mystem.lemmatize <pymystem3.mystem.Mystem.lemmatize>`
+    faster, but no grammatical information. Transport, caching, sharing and
+    prewarming of mystem process work as for :py:class:`~pymystem3.mystem.Mystem`.
+
+    Lines which contain braces are lemmatized by a :py:class:`~pymystem3.mystem.Mystem`
+    with the same options, which starts a second mystem process on the first such line.
+
+    :param  mystem_bin: path to mystem binary
+    :type   mystem_bin: str
+    :param  disambiguation: apply disambiguation (-d)
+    :type   disambiguation: bool
+    :param  fixlist: path to a custom dictionary to use for analysis (--fixlist)
+    :type   fixlist: str
+    :param  cache: cache of results for lines, see :py:class:`~pymystem3.mystem.Mystem`
+    :type   cache: object
+    :param  shared: share one mystem process with other shared instances with the same options
+    :type   shared: bool
+    :param  prewarm: install mystem if needed and start it in background right away
+    :type   prewarm: bool
+    :param  prewarm_after_fork: start mystem in a forked child right after fork (Python 3.7+)
+    :type   prewarm_after_fork: bool
+    """
+
+    #: mystem prints an empty line for an empty input line in text format
+    _skip_empty_records = False
+
+    #: :py:class:`~pymystem3.mystem.Mystem` for lines with braces, started on demand
+    _braces_mystem = None
+
+    def __init__(self, mystem_bin=None, disambiguation=True, fixlist=None, cache=None, shared=False,
+                 prewarm=False, prewarm_after_fork=False):
+        self._disambiguation = disambiguation
+        super(Lemmatizer, self).__init__(mystem_bin=mystem_bin, fixlist=fixlist, cache=cache, shared=shared,
+                                         prewarm=prewarm, prewarm_after_fork=prewarm_after_fork)
+
+    def _build_mystem_args(self):
+        mystemargs = ['-c', '-l']
+        if self._disambiguation:
+            mystemargs.append('-d')
+        if self._fixlist is not None:
+            mystemargs.append('--fixlist')
+            mystemargs.append(self._fixlist)
+        return mystemargs
+
+    def _decode(self, record):
+        return _parse_lemmas(_decode_utf8(record))
+
+    def _lemmas(self, lemmas):
+        return lemmas
+
+    def close(self):
+        super(Lemmatizer, self).close()
+        if self._braces_mystem is not None:
+            self._braces_mystem.close()
+
+    def _analyze(self, lines, max_inflight, method):
+        """
+        Lemmatize lines in text format, except for lines with braces: an empty line
+        is sent in place of such a line, and its lemmas come from JSON output.
+        """
+
+        braced = {}
+
+        def text_lines():
+            for i, line in enumerate(lines):
+                if _has_braces(line):
+                    braced[i] = line
+                    line = b''
+                yield line
+
+        for i, lemmas in enumerate(super(Lemmatizer, self)._analyze(text_lines(), max_inflight, method)):
+            line = braced.pop(i, None)
+            yield lemmas if line is None else self._lemmatize_json(line)
+
+    def _lemmatize_json(self, line):
+        if self._braces_mystem is None:
+            self._braces_mystem = Mystem(mystem_bin=self._mystem_bin, disambiguation=self._disambiguation,
+                                         fixlist=self._fixlist, cache=self._cache, shared=self._shared)
+        m = self._braces_mystem
+        with m._process.lock:
+            obj = next(m._analyze_lines([line]))
+        return m._lemmas(obj)
+
+    def lemmatize(self, text='', file_path=None):
+        """
+        Lemmatize a text.
+
+        :type   text:   str
+        :param  text:   text to lemmatize
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, file_path will be used to open utf8 text file for analysis.
+                           Argument text is not used in this case.
+        :returns:       list of lemmas
+        :rtype:         list
+        """
+
+        lemmas = self._analyze_text(text, file_path, 'lemmatize')
+        if sys.version_info[0] < 3 and isinstance(text, str):
+            lemmas = [l.encode('utf-8') for l in lemmas]
+        return lemmas
+
+    def lemmatize_many(self, docs, max_inflight=_MAX_INFLIGHT):
+        """
+        Lemmatize many texts at once.
+        See :py:meth:`Mystem.analyze_many <pymystem3.mystem.Mystem.analyze_many>`.
+
+        :type   docs:   iterable
+        :param  docs:   texts to lemmatize
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :returns:       list of lists of lemmas, one per text
+        :rtype:         list
+        """
+
+        docs = list(docs)
+        results = self._analyze_docs(docs, max_inflight, 'lemmatize_many')
+        if sys.version_info[0] < 3:
+            results = [[l.encode('utf-8') for l in lemmas] if isinstance(doc, str) else lemmas
+                       for doc, lemmas in zip(docs, results)]
+        return results
+
+    def iter_lemmatize(self, lines=None, max_inflight=_MAX_INFLIGHT, file_path=None):
+        """
+        Lemmatize a stream of lines and yield lemmas as soon as they are ready.
+        See :py:meth:`Mystem.iter_analyze <pymystem3.mystem.Mystem.iter_analyze>`.
+
+        :type   lines:  iterable
+        :param  lines:  lines to lemmatize, e.g. an open file; a string is split into lines
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, lines of the utf8 text file at file_path are lemmatized.
+                           Argument lines is not used in this case.
+        :returns:       iterator over lemmas
+        :rtype:         iterator
+        """
+
+        return self._iter_analyze(lines, max_inflight, file_path, 'iter_lemmatize')
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics of mystem calls: counters and latency histograms in Prometheus text format.
+
+Pass :py:class:`MystemMetrics` as ``on_call`` of :py:class:`~pymystem3.mystem.Mystem`
+(see :py:mod:`pymystem3.instrumentation`) and serve :py:meth:`MystemMetrics.render`,
+e.g. at ``/metrics`` of your application, or log :py:meth:`MystemMetrics.as_dict`::
+
+    metrics = MystemMetrics()
+    m = Mystem(on_call=metrics)
+    ...
+    body = metrics.render()
+
+Histograms have fixed buckets, so an observation costs a binary search and
+an increment, and quantiles are estimated from the buckets the same way as
+``histogram_quantile`` of Prometheus does.
+"""
+
+import bisect
+import collections
+import threading
+
+#: default buckets of call latency histograms, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: quantiles in :py:meth:`Histogram.as_dict`
+QUANTILES = (0.5, 0.95, 0.99)
+
+_INF = float('inf')
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return '+Inf' if value == _INF else repr(value)
+    return str(value)
+
+
+def _quantile(bounds, counts, q):
+    """
+    Estimate the `q` quantile from counts of observations in buckets with upper `bounds`
+    (the last count is of the ``+Inf`` bucket), interpolating linearly within a bucket.
+    """
+
+    rank = q * sum(counts)
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            if i == len(bounds):
+                return bounds[-1] if bounds else None
+            lower = bounds[i - 1] if i else 0.0
+            return lower + (bounds[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return None
+
+
+class _Metric(object):
+
+    """
+    A metric with a value for every combination of label values.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._values[()] = self._new()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError("Metric %s has labels %r, got %r" % (self.name, self.labelnames, labels))
+        return tuple(labels)
+
+    def _items(self):
+        with self._lock:
+            return sorted((key, self._copy(value)) for key, value in self._values.items())
+
+    def render(self):
+        """ Return the metric in Prometheus text exposition format. """
+
+        lines = ['# HELP %s %s' % (self.name, self.documentation.replace('\\', r'\\').replace('\n', r'\n')),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        for key, value in self._items():
+            labels = list(zip(self.labelnames, key))
+            for suffix, extra, sample in self._samples(value):
+                lines.append('%s%s%s %s' % (self.name, suffix, _format_labels(labels + extra),
+                                            _format_value(sample)))
+        return '\n'.join(lines) + '\n'
+
+    def as_dict(self):
+        """
+        Return the value of the metric, or a dict of values by label values
+        (joined with ``,`` if there are several labels).
+        """
+
+        items = self._items()
+        if not self.labelnames:
+            return self._as_dict(items[0][1])
+        return dict((','.join(key), self._as_dict(value)) for key, value in items)
+
+
+class Counter(_Metric):
+
+    """
+    A value which only goes up, e.g. number of calls.
+    """
+
+    type = 'counter'
+
+    def _new(self):
+        return 0
+
+    def _copy(self, value):
+        return value
+
+    def inc(self, amount=1, labels=()):
+        """ Increase the value for `labels` (a tuple of label values) by `amount`. """
+
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, labels=()):
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def _samples(self, value):
+        yield '', [], value
+
+    def _as_dict(self, value):
+        return value
+
+
+class Histogram(_Metric):
+
+    """
+    Distribution of observed values, e.g. of latency, over fixed buckets.
+
+    :param  buckets: upper bounds of buckets; a ``+Inf`` bucket is always added
+    :type   buckets: iterable
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != _INF))
+        super(Histogram, self).__init__(name, documentation, labelnames)
+
+    def _new(self):
+        # counts of observations in buckets (not cumulative), sum of observations
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+    def observe(self, value, labels=()):
+        """ Add an observation of `value` for `labels` (a tuple of label values). """
+
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = self._new()
+            histogram[0][i] += 1
+            histogram[1] += value
+
+    def quantile(self, q, labels=()):
+        """ Estimate the `q` quantile (e.g. 0.99) of observations, or return None if there are none. """
+
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._values.get(key)
+            counts = list(histogram[0]) if histogram is not None else []
+        return _quantile(self.buckets, counts, q)
+
+    def _samples(self, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (_INF,), counts):
+            cumulative += count
+            yield '_bucket', [('le', _format_value(bound))], cumulative
+        yield '_sum', [], total
+        yield '_count', [], cumulative
+
+    def _as_dict(self, value):
+        counts, total = value
+        result = {'count': sum(counts), 'sum': total}
+        for q in QUANTILES:
+            result['p%g' % (q * 100)] = _quantile(self.buckets, counts, q)
+        return result
+
+
+class MetricsRegistry(object):
+
+    """
+    A set of metrics rendered together.
+
+    Metrics are created by :py:meth:`counter` and :py:meth:`histogram`; asking for
+    a metric which is already registered returns it, so several
+    :py:class:`MystemMetrics` may share a registry.
+    """
+
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError("Metric %s is already registered as a %s" % (name, metric.type))
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """ Return the :py:class:`Counter` called `name`, registering it if needed. """
+        return self._get(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """ Return the :py:class:`Histogram` called `name`, registering it if needed. """
+        return self._get(Histogram, name, documentation, labelnames, buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        """ Return all metrics in Prometheus text exposition format. """
+        return ''.join(metric.render() for metric in self.metrics())
+
+    def as_dict(self):
+        """ Return values of all metrics by their names, see :py:meth:`Counter.as_dict`. """
+        return dict((metric.name, metric.as_dict()) for metric in self.metrics())
+
+
+class MystemMetrics(object):
+
+    """
+    Metrics of :py:class:`~pymystem3.mystem.Mystem` calls, to be passed as its ``on_call``.
+
+    It collects (with the default `prefix`):
+
+    - ``mystem_calls_total`` and ``mystem_call_duration_seconds`` histogram by ``method``
+    - ``mystem_lines_total`` and ``mystem_tokens_total``, to compute lines and tokens per second
+    - ``mystem_cache_hits_total`` and ``mystem_restarts_total`` (mystem died and was restarted)
+    - ``mystem_bytes_total`` by ``direction`` (``in`` to mystem, ``out`` of it)
+    - ``mystem_phase_seconds_total`` by ``phase`` (``write``, ``wait``, ``read``, ``parse``)
+
+    It may be shared by several instances, e.g. workers of a :py:class:`~pymystem3.pool.MystemPool`.
+
+    :param  registry: registry to add metrics to, a new one by default
+    :type   registry: :py:class:`MetricsRegistry`
+    :param  buckets: upper bounds of latency buckets, in seconds
+    :type   buckets: iterable
+    :param  prefix: prefix of metric names
+    :type   prefix: str
+    """
+
+    def __init__(self, registry=None, buckets=LATENCY_BUCKETS, prefix='mystem'):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.calls = self.registry.counter(prefix + '_calls_total', "Number of calls.", ('method',))
+        self.latency = self.registry.histogram(prefix + '_call_duration_seconds', "Duration of calls in seconds.",
+                                               ('method',), buckets)
+        self.lines = self.registry.counter(prefix + '_lines_total', "Number of lines analyzed.")
+        self.tokens = self.registry.counter(prefix + '_tokens_total', "Number of tokens produced.")
+        self.cache_hits = self.registry.counter(prefix + '_cache_hits_total', "Number of lines found in cache.")
+        self.restarts = self.registry.counter(prefix + '_restarts_total',
+                                              "Number of times mystem died during a call and was restarted.")
+        self.bytes = self.registry.counter(prefix + '_bytes_total', "Bytes sent to (in) and received from (out) mystem.",
+                                           ('direction',))
+        self.phase_time = self.registry.counter(
+            prefix + '_phase_seconds_total',
+            "Time spent writing to mystem, waiting for it, reading and parsing its output, in seconds.", ('phase',))
+
+    def __call__(self, call):
+        """ Record :py:class:`~pymystem3.instrumentation.CallStats` of a call. """
+
+        labels = (call.method,)
+        self.calls.inc(1, labels)
+        self.latency.observe(call.total_time, labels)
+        self.lines.inc(call.lines)
+        self.tokens.inc(call.tokens)
+        if call.cache_hits:
+            self.cache_hits.inc(call.cache_hits)
+        if call.restarts:
+            self.restarts.inc(call.restarts)
+        self.bytes.inc(call.bytes_in, ('in',))
+        self.bytes.inc(call.bytes_out, ('out',))
+        self.phase_time.inc(call.write_time, ('write',))
+        self.phase_time.inc(call.wait_time, ('wait',))
+        self.phase_time.inc(call.read_time, ('read',))
+        self.phase_time.inc(call.parse_time, ('parse',))
+
+    def render(self):
+        """ Return metrics of the registry in Prometheus text exposition format. """
+        return self.registry.render()
+
+    def as_dict(self):
+        """
+        Return metrics of the registry by their names, see :py:meth:`MetricsRegistry.as_dict`,
+        and ``lines_per_second`` and ``tokens_per_second`` of the time spent in calls.
+        """
+
+        result = self.registry.as_dict()
+        busy = sum(total for _, (_, total) in self.latency._items())
+        result['lines_per_second'] = self.lines.value() / busy if busy else None
+        result['tokens_per_second'] = self.tokens.value() / busy if busy else None
+        return result
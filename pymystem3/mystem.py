@@ -5,31 +5,46 @@ A Python wrapper of the Yandex Mystem 3.1 morphological analyzer.
 
 from __future__ import print_function
 
-from itertools import ifilter, imap
+from itertools import chain, ifilter, imap, islice, izip
+import collections
+import errno
+import hashlib
+import io
 import os
 import platform
+import re
 import select
 import subprocess
 import sys
 import socket
+import threading
+import time
+import weakref
 
-if sys.version_info[0] < 3:
-    from cStringIO import StringIO
-else:
-    from io import BytesIO as StringIO
+import json
 
 try:
-    import ujson as json
+    import ujson
 except ImportError:
-    import json
+    ujson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .constants import (MYSTEM_BIN, MYSTEM_EXE, MYSTEM_DIR)
+from .instrumentation import (CallStats, _clock, _Instrumentation)
+from .tokens import (Token, _TokenFactory)
 
 try:
     broken_pipe = BrokenPipeError
 except NameError:
     broken_pipe = socket.error
 
+# reads output right into a buffer; there is no such function on Python 2 and Windows
+_readv = getattr(os, 'readv', None)
+
 
 _TARBALL_URLS = {
     'linux': {
@@ -43,9 +58,32 @@ _TARBALL_URLS = {
     },
 }
 
-_NL = unicode('\n').encode('utf-8')
+_NL_TEXT = unicode('\n')
+_NL = _NL_TEXT.encode('utf-8')
 _POSIX = os.name == 'posix'
 
+_CHUNK_SIZE = 64 * 1024
+_BUFFER_SIZE = 4 * _CHUNK_SIZE
+_MAX_BUFFER_FACTOR = 16
+_TIMEOUT = 30
+_MAX_INFLIGHT = 1000
+_MAX_WORDS = 100000
+
+_WORD_RE = re.compile(r'\w+(?:-\w+)*', re.UNICODE)
+
+
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    _registry._lock = threading.Lock()
+    for mystem in list(_instances):
+        mystem._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 
 _PIPELINE_MODE = False
 if _POSIX and '__pypy__' in sys.builtin_module_names:
@@ -133,6 +171,93 @@ def _get_tarball_url():
     return url
 
 
+def _iter_lines(source):
+    """
+    Iterate over lines of `source`: a string, a file or any iterable of strings.
+    Line breaks are stripped, and strings with several lines are split.
+    """
+
+    if isinstance(source, basestring):
+        source = source.splitlines()
+    for chunk in source:
+        lines = chunk.splitlines()
+        if not lines:
+            lines = [chunk]
+        for line in lines:
+            yield line
+
+
+def _decode_utf8(data):
+    """ Decode utf8 bytes or a memoryview of them, without copying the memoryview where possible. """
+
+    if sys.version_info[0] < 3 and isinstance(data, memoryview):
+        data = data.tobytes()
+    return unicode(data, 'utf-8')
+
+
+def _loads_orjson(data):
+    return orjson.loads(data)
+
+
+def _loads_ujson(data):
+    return ujson.loads(_decode_utf8(data))
+
+
+def _loads_json(data):
+    return json.loads(_decode_utf8(data))
+
+
+#: JSON decoders for :py:func:`_get_json_decoder` in order of preference: name, module, function
+_JSON_DECODERS = [
+    ('orjson', orjson, _loads_orjson),
+    ('ujson', ujson, _loads_ujson),
+    ('json', json, _loads_json),
+]
+
+
+def _get_json_decoder(name=None):
+    """
+    Return a function which parses a line of mystem JSON output given as bytes.
+
+    orjson parses bytes directly; the others need them decoded to text first.
+
+    :param  name: ``'orjson'``, ``'ujson'`` or ``'json'``; the fastest installed one if None
+    :type   name: str
+    """
+
+    for decoder_name, module, loads in _JSON_DECODERS:
+        if name is None and module is not None or name == decoder_name:
+            if module is None:
+                raise ImportError("JSON decoder %s is not installed" % name)
+            return loads
+    raise ValueError("Unknown JSON decoder %r" % name)
+
+
+def _check_max_inflight(max_inflight):
+    if max_inflight is not None and max_inflight < 1:
+        raise ValueError("max_inflight must be None or at least 1, got %r" % (max_inflight,))
+
+
+def _read_file_lines(path):
+    """
+    Iterate over lines of utf8 text file at `path` as bytes, without line breaks.
+    Only one line is kept in memory at a time.
+    """
+
+    with io.open(path, 'rb') as f:
+        for line in f:
+            yield line.rstrip(b'\r\n')
+
+
+def _copy_token(token):
+    if isinstance(token, Token):
+        return token.copy()
+    token = dict(token)
+    if 'analysis' in token:
+        token['analysis'] = [dict(a) for a in token['analysis']]
+    return token
+
+
 def _set_non_blocking(fd):
     """
     Set the file description of the given file descriptor to non-blocking.
@@ -145,7 +270,915 @@ def _set_non_blocking(fd):
         fcntl.fcntl(fd, fcntl.F_SETFL, flags)
 
 
-class Mystem(object):
+def _get_mystem_bin(mystem_bin=None, install=True):
+    """
+    Return path to mystem binary: `mystem_bin` if given, else :envvar:`MYSTEM_BIN`,
+    else :py:const:`~pymystem3.constants.MYSTEM_BIN` (installed if needed and `install` is true).
+    """
+
+    if mystem_bin is None:
+        mystem_bin = os.environ.get("MYSTEM_BIN", None)
+
+    if mystem_bin is None:
+        if install:
+            autoinstall()
+        mystem_bin = MYSTEM_BIN
+
+    return mystem_bin
+
+
+def _get_mystem_args(
+    grammar_info=True,
+    disambiguation=True,
+    entire_input=True,
+    glue_grammar_info=True,
+    weight=False,
+    generate_all=False,
+    no_bastards=False,
+    end_of_sentence=False,
+    fixlist=None,
+    use_english_names=False
+):
+    """
+    Build mystem command line arguments for the given options.
+    See :py:class:`Mystem` for their description.
+    """
+
+    mystemargs = ["--format", "json"]
+
+    if grammar_info:
+        mystemargs.append('-i')
+    if glue_grammar_info:
+        mystemargs.append('-g')
+
+    if disambiguation:
+        mystemargs.append('-d')
+
+    if entire_input:
+        mystemargs.append('-c')
+    if no_bastards:
+        mystemargs.append('-w')
+    if end_of_sentence:
+        mystemargs.append('-s')
+
+    if weight:
+        mystemargs.append('--weight')
+
+    if generate_all:
+        mystemargs.append('--generate-all')
+
+    if fixlist is not None:
+        mystemargs.append('--fixlist')
+        mystemargs.append(fixlist)
+
+    if use_english_names:
+        mystemargs.append('--eng-gr')
+
+    return mystemargs
+
+
+def _file_digest(path):
+    """
+    Return SHA-1 hex digest of contents of the file at `path`.
+    """
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _OutputBuffer(object):
+
+    """
+    Buffer of mystem output which splits it into records, i.e. JSON lines, as it arrives.
+
+    Output is read right into a reusable bytearray (with :py:func:`os.readv`
+    where it is available), and records are returned as memoryview slices of it,
+    so reading output allocates no new strings and the parser gets the bytes
+    in place. A record is valid only until the next read, so it has to be
+    parsed or copied before that. The buffer grows only when a record does
+    not fit in it, and shrinks back once such a record is done.
+
+    Every byte is scanned for a line break only once, so a long line costs
+    linear time no matter how many chunks it comes in.
+    Empty records are skipped, unless `skip_empty` is false.
+    """
+
+    def __init__(self, skip_empty=True, size=_BUFFER_SIZE):
+        self._skip_empty = skip_empty
+        self._size = size
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # start of the incomplete record
+        self._end = 0  # end of the data
+        self.size = 0  # total size of output read
+
+    def read(self, fd):
+        """ Read next chunk of output from file descriptor `fd` and return the list of records completed by it. """
+
+        self._reserve(_CHUNK_SIZE)
+        if _readv is not None:
+            size = _readv(fd, [self._view[self._end:]])
+        else:
+            data = os.read(fd, len(self._buf) - self._end)
+            size = len(data)
+            self._buf[self._end:self._end + size] = data
+        if not size:
+            raise broken_pipe(errno.EPIPE, "mystem has closed its output")
+        return self._split(size)
+
+    def feed(self, data):
+        """ Add next chunk of output and return the list of records completed by it. """
+
+        self._reserve(len(data))
+        self._buf[self._end:self._end + len(data)] = data
+        return self._split(len(data))
+
+    def tail(self):
+        """ Return the incomplete record received so far. """
+        return self._view[self._start:self._end].tobytes()
+
+    def _reserve(self, size):
+        """ Make room for `size` more bytes after the data. """
+
+        if len(self._buf) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buf):
+            # move the incomplete record to the start; the records returned before are done with
+            tail = self._view[self._start:self._end]
+            self._buf[:pending] = tail if pending <= self._start else tail.tobytes()
+        else:
+            # a new buffer instead of resizing, which is not allowed while slices of the old one exist
+            buf = bytearray(max(2 * len(self._buf), pending + size))
+            buf[:pending] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._start = 0
+        self._end = pending
+
+    def _split(self, size):
+        buf = self._buf
+        view = self._view
+        start = self._start
+        records = []
+        end = buf.find(_NL, self._end, self._end + size)
+        self._end += size
+        self.size += size
+        while end >= 0:
+            # only a short record may be blank, so longer ones are not copied to check it
+            if not self._skip_empty or end - start > 2 or buf[start:end].strip():
+                records.append(view[start:end])
+            start = end + 1
+            end = buf.find(_NL, start, self._end)
+
+        if start == self._end:
+            start = self._end = 0
+            if len(buf) > _MAX_BUFFER_FACTOR * self._size:
+                self._buf = bytearray(self._size)
+                self._view = memoryview(self._buf)
+        self._start = start
+        return records
+
+
+class _Pipeline(object):
+
+    """
+    Feed lines to mystem and parse its output at the same time.
+
+    Both pipes are non-blocking, so a single :py:func:`select.select` loop
+    writes as much input as the pipe takes whenever it has room and reads
+    output whenever it is ready. Neither side can wait for the other, so
+    even a huge line streams through at pipe speed instead of hanging
+    when mystem fills its stdout while we are still writing to its stdin.
+    Lines are taken from the `lines` iterator only while there are less
+    than `max_inflight` of them in the `inflight` deque, which holds
+    ``[line, tokens]`` entries in input order. Output is parsed as soon
+    as it is read, right from the read buffer (see :py:class:`_OutputBuffer`).
+
+    mystem prints exactly one JSON line per input line, which lets us
+    match the responses with `unanswered` lines. Lines found in the cache
+    are not sent at all, but their output is still yielded in order.
+    If the loop is left before all lines have been answered, the process
+    is closed, so that a late response can not be mixed up with the
+    output of the next call. While the generator is suspended with lines
+    not answered yet, another call on the process raises :py:exc:`RuntimeError`.
+    """
+
+    def __init__(self, mystem, lines, inflight, max_inflight=None):
+        self.mystem = mystem
+        self.lines = lines
+        self.inflight = inflight
+        self.max_inflight = max_inflight
+        self.cache = mystem._cache
+        self.prefix = mystem._cache_prefix
+        self.decode = mystem._decode
+        self.output = _OutputBuffer(mystem._skip_empty_records)
+        self.unanswered = collections.deque()
+        self.wbuf = memoryview(b'')
+        self.wpos = 0
+        self.exhausted = False
+
+    def run(self):
+        """ Yield the result of every line in input order. """
+
+        mystem = self.mystem
+        inflight = self.inflight
+        unanswered = self.unanswered
+        try:
+            mystem._process.acquire_pipeline(unanswered)
+            mystem._prepare_process()
+            while True:
+                if not self.exhausted and len(self.wbuf) - self.wpos < _CHUNK_SIZE:
+                    self._fill()
+
+                while inflight and inflight[0][1] is not None:
+                    if not unanswered:
+                        mystem._process.release_pipeline(unanswered)
+                    yield inflight.popleft()[1]
+                    mystem._process.acquire_pipeline(unanswered)
+
+                if not unanswered:
+                    if self.exhausted:
+                        break
+                    continue
+
+                if mystem._process.proc is None:
+                    mystem._start_mystem()
+                self._exchange()
+        finally:
+            mystem._process.release_pipeline(unanswered)
+            if unanswered:
+                mystem._terminate()
+
+    def _fill(self):
+        """ Take lines into the write buffer, up to a chunk of them or `max_inflight` lines in flight. """
+
+        parts = [self.wbuf[self.wpos:].tobytes()]
+        size = len(parts[0])
+        while size < _CHUNK_SIZE and (self.max_inflight is None or len(self.inflight) < self.max_inflight):
+            line = next(self.lines, None)
+            if line is None:
+                self.exhausted = True
+                break
+            entry = [line, None]
+            self.inflight.append(entry)
+            record = self._lookup(line) if self.cache is not None else None
+            if record is not None:
+                entry[1] = self.decode(record)
+            else:
+                self.unanswered.append(entry)
+                parts.append(line)
+                parts.append(_NL)
+                size += len(line) + 1
+        self.wbuf = memoryview(b''.join(parts))
+        self.wpos = 0
+
+    def _exchange(self):
+        """ Wait until mystem takes input or gives output, then write and read what we can. """
+
+        process = self.mystem._process
+        infd = process.procin_no
+        wlist = [infd] if self.wpos < len(self.wbuf) else []
+        rd, wr, _ = self._select([process.procout_no], wlist)
+        if not rd and not wr:
+            raise RuntimeError("Problem has been occured. Current state:\nlines pending: %d\nout:\n%r" %
+                               (len(self.unanswered), self.output.tail()[0:2000]))
+
+        if wr:
+            self.wpos += self._write(infd)
+
+        if rd:
+            records = self._read(process.procout_no)
+            process.mark_ready()
+            for record in records:
+                entry = self.unanswered.popleft()
+                entry[1] = self.decode(record)
+                if self.cache is not None:
+                    self.cache.put((self.prefix, entry[0]), record.tobytes())
+
+    def _lookup(self, line):
+        return self.cache.get((self.prefix, line))
+
+    def _select(self, rlist, wlist):
+        return select.select(rlist, wlist, [], _TIMEOUT)
+
+    def _write(self, fd):
+        """ Write what the pipe takes from the write buffer, return the number of bytes written. """
+
+        try:
+            return os.write(fd, self.wbuf[self.wpos:])
+        except (IOError, OSError) as e:
+            if e.errno == errno.EPIPE:
+                raise broken_pipe(errno.EPIPE, os.strerror(errno.EPIPE))
+            if e.errno != errno.EAGAIN:
+                raise
+        return 0
+
+    def _read(self, fd):
+        return self.output.read(fd)
+
+
+class _InstrumentedPipeline(_Pipeline):
+
+    """
+    :py:class:`_Pipeline` which records its I/O and parsing in
+    :py:class:`~pymystem3.instrumentation.CallStats` of the current call.
+    """
+
+    def __init__(self, mystem, lines, inflight, max_inflight=None):
+        super(_InstrumentedPipeline, self).__init__(mystem, lines, inflight, max_inflight)
+        self.call = mystem._call
+        self._parse = self.decode
+        self.decode = self._timed_decode
+
+    def _timed_decode(self, record):
+        started = _clock()
+        obj = self._parse(record)
+        self.call.parse_time += _clock() - started
+        return obj
+
+    def _lookup(self, line):
+        record = super(_InstrumentedPipeline, self)._lookup(line)
+        if record is not None:
+            self.call.cache_hits += 1
+        return record
+
+    def _select(self, rlist, wlist):
+        started = _clock()
+        ready = super(_InstrumentedPipeline, self)._select(rlist, wlist)
+        self.call.wait_time += _clock() - started
+        return ready
+
+    def _write(self, fd):
+        started = _clock()
+        written = super(_InstrumentedPipeline, self)._write(fd)
+        self.call.write_time += _clock() - started
+        self.call.bytes_in += written
+        return written
+
+    def _read(self, fd):
+        started = _clock()
+        size = self.output.size
+        records = super(_InstrumentedPipeline, self)._read(fd)
+        self.call.read_time += _clock() - started
+        self.call.bytes_out += self.output.size - size
+        return records
+
+
+class _Process(object):
+
+    """
+    A mystem process and the lock which serializes its use.
+
+    Every :py:class:`Mystem` has its own one, unless it is shared:
+    then it belongs to :py:data:`_registry`.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.proc = None
+        self.procin = None
+        self.procout = None
+        self.procin_no = None
+        self.procout_no = None
+        self.pid = None
+        self.refs = 0
+        self.spawns = 0
+        self.started = None
+        self.startup_time = None
+        self.warming = None
+        self.pipeline = None
+
+    def start(self, args):
+        self.proc = subprocess.Popen(args,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     bufsize=0,
+                                     close_fds=True if _POSIX else False)
+
+        self.procin, self.procout = self.proc.stdin, self.proc.stdout
+        self.procin_no = self.procin.fileno()
+        self.procout_no = self.procout.fileno()
+        self.pid = os.getpid()
+        self.spawns += 1
+        self.started = time.time()
+        self.startup_time = None
+        _set_non_blocking(self.procin)
+        _set_non_blocking(self.procout)
+
+    def wait_warm(self):
+        """ Wait until the process started in background by :py:meth:`Mystem._warm_up` is ready. """
+        warming = self.warming
+        if warming is not None and warming is not threading.current_thread():
+            warming.join()
+
+    def acquire_pipeline(self, owner):
+        """
+        Mark the process as used by `owner`, a pipeline which has lines not answered yet.
+
+        The lock does not prevent it from being used by the same thread, e.g. in a loop
+        over :py:meth:`Mystem.iter_analyze`, and output for another call would be mixed up then.
+        """
+
+        if self.pipeline is not None and self.pipeline is not owner:
+            raise RuntimeError("mystem process is in use by an unfinished iterator, "
+                               "exhaust or close it before the next call")
+        self.pipeline = owner
+
+    def release_pipeline(self, owner):
+        if self.pipeline is owner:
+            self.pipeline = None
+
+    def mark_ready(self):
+        if self.startup_time is None:
+            self.startup_time = time.time() - self.started
+
+    def terminate(self):
+        if self.proc is not None:
+            self.proc.terminate()  # Send TERM signal to process
+            self.procin.close()  # Then close stdin
+            self.procout.close()  # And stdout
+            self.proc.wait()  # Finally wait for terminaion
+        self._reset()
+
+    def drop_inherited(self):
+        """
+        Forget the process if it was inherited from the parent process by fork.
+
+        It still serves the parent, so it is neither terminated nor waited for,
+        only the copies of its pipes are closed.
+        """
+
+        if self.proc is None or self.pid == os.getpid():
+            return
+
+        for f in (self.procin, self.procout):
+            try:
+                f.close()
+            except (IOError, OSError):
+                pass
+        self._reset()
+
+    def _reset(self):
+        self.startup_time = None
+        self.procin = None
+        self.procout = None
+        self.procin_no = None
+        self.procout_no = None
+        self.proc = None
+
+
+class _ProcessRegistry(object):
+
+    """
+    Reference-counted mystem processes of shared :py:class:`Mystem` instances,
+    one per mystem binary and options.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = {}
+        self.spawns_avoided = 0
+
+    def acquire(self, key):
+        with self._lock:
+            process = self._processes.get(key)
+            if process is None:
+                process = self._processes[key] = _Process()
+        self.attach(process)
+        return process
+
+    def attach(self, process):
+        with self._lock:
+            if process.refs > 0 or process.proc is not None:
+                self.spawns_avoided += 1
+            process.refs += 1
+
+    def release(self, process):
+        """ Return the number of instances which still use the process. """
+        with self._lock:
+            process.refs -= 1
+            return process.refs
+
+    def stats(self):
+        with self._lock:
+            processes = list(self._processes.values())
+            return {
+                'configs': len(processes),
+                'processes': sum(1 for p in processes if p.proc is not None),
+                'instances': sum(p.refs for p in processes),
+                'spawns': sum(p.spawns for p in processes),
+                'spawns_avoided': self.spawns_avoided,
+            }
+
+
+_registry = _ProcessRegistry()
+
+
+_prewarmed = []
+
+
+def prewarm(**options):
+    """
+    Start a shared mystem process for the given options in background,
+    so that :py:class:`Mystem` instances created later with ``shared=True``
+    and the same options find it warm. The process is kept until exit.
+
+    :param  options: options of :py:class:`Mystem`
+    :returns: the shared instance which keeps the process
+    :rtype: Mystem
+    """
+
+    mystem = Mystem(shared=True, prewarm=True, **options)
+    _prewarmed.append(mystem)
+    return mystem
+
+
+def shared_process_stats():
+    """
+    Return counters of mystem processes shared by :py:class:`Mystem` instances
+    created with ``shared=True``.
+
+    `spawns_avoided` is the number of times an instance attached to a process
+    which was already used by another instance, instead of starting its own.
+
+    :rtype: dict
+    """
+
+    return _registry.stats()
+
+
+class _BaseMystem(object):
+
+    """
+    Base of :py:class:`Mystem` and :py:class:`~pymystem3.lemmatizer.Lemmatizer`:
+    a mystem process run with arguments of :py:meth:`_build_mystem_args`, which
+    is fed lines, with the output for every line parsed by :py:meth:`_decode`.
+
+    It starts, shares, prewarms and closes the process, keeps it safe across fork,
+    caches output of lines and restarts mystem if it dies.
+    Options are described in :py:class:`Mystem`.
+    """
+
+    #: the process, None only if the initializer has failed
+    _process = None
+
+    #: :py:class:`~pymystem3.instrumentation.CallStats` of the current call, if it is recorded
+    _call = None
+
+    def __init__(self, mystem_bin=None, fixlist=None, cache=None, shared=False, prewarm=False,
+                 prewarm_after_fork=False):
+        self._process = _Process()
+        self._shared = shared
+        self._attached = False
+        self._fixlist = fixlist
+        self._cache = cache
+        self._prewarm_after_fork = prewarm_after_fork
+        self._file_path = ""
+
+        # with prewarm, mystem is installed in background
+        self._mystem_bin = _get_mystem_bin(mystem_bin, install=not prewarm)
+        self._mystemargs = self._build_mystem_args()
+        self._cache_prefix = tuple(self._mystemargs)
+        if self._fixlist is not None:
+            # results depend on the dictionary, not only on its path
+            self._cache_prefix += (_file_digest(self._fixlist),)
+
+        if self._shared:
+            self._process = _registry.acquire((self._mystem_bin,) + self._cache_prefix)
+            self._attached = True
+
+        _instances.add(self)
+
+        if prewarm:
+            with self._process.lock:
+                if self._process.proc is None and self._process.warming is None:
+                    self._process.warming = threading.Thread(target=self._warm_up)
+                    self._process.warming.daemon = True
+                    self._process.warming.start()
+
+    #: mystem prints no empty lines in JSON format
+    _skip_empty_records = True
+
+    def __del__(self):
+        if self._process is not None:
+            self.close()  # terminate process on exit
+
+    def __enter__(self):
+        if self._process.proc is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """
+        Run mystem binary.
+
+        .. note:: It is not mandatory to call it. Use it if you want to avoid waiting for mystem loads.
+        """
+
+        with self._process.lock:
+            self._start_mystem()
+
+    def close(self):
+        """
+        Terminate mystem process.
+
+        A shared process is terminated only when the last instance using it is closed.
+        """
+
+        self._process.wait_warm()
+        with self._process.lock:
+            if self._shared:
+                if not self._attached:
+                    return
+                self._attached = False
+                if _registry.release(self._process) > 0:
+                    return
+            self._terminate()
+
+    def _terminate(self):
+        self._process.drop_inherited()
+        self._process.terminate()
+
+    def _prepare_process(self):
+        """
+        Get ready to use the mystem process: forget the one inherited from the parent
+        process by fork, and attach again to the shared one after :py:meth:`close`.
+        """
+
+        self._process.wait_warm()
+        self._process.drop_inherited()
+        if self._shared and not self._attached:
+            _registry.attach(self._process)
+            self._attached = True
+
+    def _warm_up(self):
+        """
+        Install mystem if needed, start it and wait for its first output.
+        Runs in a background thread; the threads which use the process wait for it to finish.
+        """
+
+        try:
+            if self._mystem_bin == MYSTEM_BIN:
+                autoinstall()
+            if not _PIPELINE_MODE:
+                return  # mystem is started for every call anyway
+
+            self._start_mystem()
+            process = self._process
+            os.write(process.procin_no, _NL)
+            output = _OutputBuffer(skip_empty=False, size=_CHUNK_SIZE)
+            records = []
+            while not records:
+                rd, _, _ = select.select([process.procout_no], [], [], _TIMEOUT)
+                if not rd:
+                    raise RuntimeError("mystem has not answered in %s seconds" % _TIMEOUT)
+                records = output.read(process.procout_no)
+            process.mark_ready()
+        except Exception:
+            # the first call starts mystem again and gets the error
+            self._terminate()
+        finally:
+            self._process.warming = None
+
+    def status(self):
+        """
+        Return the state of mystem process, e.g. for readiness probes.
+
+        ``startup_time`` is the time from start of the process to its first output,
+        in seconds, or None if it has not answered yet.
+
+        :rtype: dict
+        """
+
+        process = self._process
+        return {
+            'running': process.proc is not None,
+            'warming': process.warming is not None,
+            'ready': process.startup_time is not None,
+            'startup_time': process.startup_time,
+        }
+
+    def _after_fork(self):
+        # the lock may have been held by a thread which does not exist in the child
+        self._process.lock = threading.RLock()
+        self._process.warming = None
+        self._process.pipeline = None
+        self._process.drop_inherited()
+        if self._prewarm_after_fork and self._process.proc is None:
+            self._start_mystem()
+
+    def _start_mystem(self):
+        self._prepare_process()
+        Mystem_args = [self._mystem_bin] + self._mystemargs
+        if self._file_path:
+            Mystem_args.append(self._file_path)
+        self._process.start(Mystem_args)
+
+    def _build_mystem_args(self):
+        """ Build mystem command line arguments for options of the instance. """
+        raise NotImplementedError
+
+    def _decode(self, record):
+        """ Parse mystem output for a line. """
+        raise NotImplementedError
+
+    def _lemmas(self, obj):
+        """ Return lemmas of the result of a line. """
+        raise NotImplementedError
+
+    def _analyze(self, lines, max_inflight, method):
+        """
+        Analyze lines and yield the result of every line in input order.
+        `method` is the name of the public method which is called.
+        """
+
+        return self._analyze_lines(lines, max_inflight)
+
+    def _analyze_text(self, text, file_path, method):
+        """ Analyze a text, or the file at `file_path`, and return the results of its lines joined. """
+
+        result = []
+        with self._process.lock:
+            if file_path and not _PIPELINE_MODE:
+                # file path will be used and passed to mystem.exe
+                self._file_path = file_path
+                try:
+                    result.extend(self._analyze_impl(''))
+                finally:
+                    self._file_path = ""
+                return result
+
+            lines = _read_file_lines(file_path) if file_path else text.splitlines()
+            for obj in self._analyze(lines, None, method):
+                result.extend(obj)
+        return result
+
+    def _analyze_docs(self, docs, max_inflight, method):
+        """
+        Analyze texts through one mystem process and return the results of lines of every text joined.
+
+        mystem answers every input line with exactly one output line, so results
+        are split back by the number of lines in each text and no boundary
+        markers are needed.
+        """
+
+        _check_max_inflight(max_inflight)
+        counts = []
+        lines = []
+        for doc in docs:
+            doc_lines = doc.splitlines()
+            counts.append(len(doc_lines))
+            lines.extend(doc_lines)
+
+        results = []
+        with self._process.lock:
+            objs = self._analyze(lines, max_inflight, method)
+            for count in counts:
+                result = []
+                for obj in islice(objs, count):
+                    result.extend(obj)
+                results.append(result)
+        return results
+
+    def _analyze_as_lines(self, lines, method):
+        """
+        Return the result of every line of `lines` in order. Lines are sent to mystem
+        as they are, without splitting them at line breaks other than ``\\n``,
+        so every line gets exactly one result.
+        """
+
+        with self._process.lock:
+            return list(self._analyze(lines, _MAX_INFLIGHT, method))
+
+    def _iter_analyze(self, lines, max_inflight, file_path, method):
+        """ Analyze a stream of lines, or lines of the file at `file_path`, and return an iterator over items of the results. """
+
+        _check_max_inflight(max_inflight)
+        lines = _read_file_lines(file_path) if file_path else _iter_lines(lines)
+        return self._iter_items(lines, max_inflight, method)
+
+    def _iter_items(self, lines, max_inflight, method):
+        with self._process.lock:
+            for obj in self._analyze(lines, max_inflight, method):
+                for item in obj:
+                    yield item
+
+    def _analyze_lines(self, lines, max_inflight=None):
+        """ Return a generator of lists of tokens of `lines` in input order. """
+
+        if not _PIPELINE_MODE:
+            return self._analyze_each_line(lines)
+        return self._analyze_pipelined(lines, max_inflight)
+
+    def _analyze_pipelined(self, lines, max_inflight=None):
+        """
+        Analyze lines through one mystem process in a pipelined way.
+        Yield the list of tokens of every line in input order.
+
+        If mystem dies in the middle, it is restarted once and the lines
+        which have not been answered yet are sent again.
+        """
+
+        lines = (l.encode('utf-8') if isinstance(l, unicode) else l for l in lines)
+        inflight = collections.deque()
+        done = 0
+        failed_at = None
+        while True:
+            try:
+                for obj in self._pipeline(lines, inflight, max_inflight):
+                    done += 1
+                    yield obj
+                return
+            except broken_pipe:
+                if failed_at == done:
+                    raise
+                failed_at = done
+                if self._call is not None:
+                    self._call.restarts += 1
+                lines = chain([entry[0] for entry in inflight], lines)
+                inflight.clear()
+                self._terminate()
+                self._start_mystem()
+
+    def _pipeline(self, lines, inflight, max_inflight=None):
+        """
+        Return a generator of results of `lines` analyzed by :py:class:`_Pipeline`,
+        which records the current call if it is instrumented.
+        """
+
+        pipeline_class = _Pipeline if self._call is None else _InstrumentedPipeline
+        return pipeline_class(self, lines, inflight, max_inflight).run()
+
+    def _analyze_each_line(self, lines):
+        """ Analyze lines one by one, starting mystem for every line which is not in the cache. """
+
+        cache = self._cache
+        for line in lines:
+            if isinstance(line, unicode):
+                line = line.encode('utf-8')
+            key = (self._cache_prefix, line)
+            record = cache.get(key) if cache is not None else None
+            if record is None:
+                try:
+                    record = self._communicate(line)
+                except broken_pipe:
+                    self._terminate()
+                    self._start_mystem()
+                    record = self._communicate(line)
+                if cache is not None:
+                    cache.put(key, record)
+            yield self._decode_output(record)
+
+    if not _PIPELINE_MODE:
+        # Without pipelining mystem is started for every call,
+        # and in file mode it reads the file itself.
+
+        def _analyze_impl(self, text):
+            if isinstance(text, unicode):
+                text = text.encode('utf-8')
+
+            out = self._communicate(text)
+            try:
+                obj = self._decode_output(out)
+            except (IOError, ValueError):
+                raise RuntimeError("Problem has been occured. Current state:\ntext:\n%r\nout:\n%r" %
+                                   (text[0:2000], out[0:2000]))
+
+            return obj
+
+        def _communicate(self, text):
+            self._prepare_process()
+            if self._process.proc is None:
+                self._start_mystem()
+
+            if not self._file_path:
+                self._process.procin.write(text)
+                self._process.procin.write(_NL)
+
+            out, _ = self._process.proc.communicate()
+            self._process.proc = None
+            return out
+
+    def _decode_output(self, out):
+        """
+        Parse mystem output for several lines, e.g. for a whole file, into a list of tokens.
+        """
+
+        obj = []
+        for record in out.split(_NL):
+            if record.strip():
+                obj.extend(self._decode(record))
+        return obj
+
+
+class Mystem(_BaseMystem):
 
     """
     Wrap mystem binary to be able it use from Python.
@@ -176,8 +1209,47 @@ class Mystem(object):
     :type   fixlist: str
     :param  use_english_names: english names of grammemes (--eng-gr)
     :type   use_english_names: bool
+    :param  cache: cache of analysis results for lines, e.g. :py:class:`~pymystem3.cache.LRUCache`
+                   or :py:class:`~pymystem3.cache.DiskCache`
+    :type   cache: object
+    :param  compact_tokens: return :py:class:`~pymystem3.tokens.Token` objects instead of dicts to save memory;
+                            equal analyses are shared through a table of up to
+                            :py:data:`~pymystem3.tokens.MAX_ENTRIES` of them
+    :type   compact_tokens: bool
+    :param  dedup_words: send every distinct word form to mystem only once and keep its analysis
+                         in :py:attr:`vocabulary` (works only with disambiguation=False and end_of_sentence=False)
+    :type   dedup_words: bool
+    :param  max_words: limit of the size of :py:attr:`vocabulary`, which grows with every new word form;
+                       when a batch of lines would exceed it, the vocabulary is cleared (None for no limit)
+    :type   max_words: int
+    :param  prewarm_after_fork: start mystem in a forked child right after fork (Python 3.7+),
+                                instead of on first use
+    :type   prewarm_after_fork: bool
+    :param  shared: share one mystem process with other shared instances with the same options
+                    (see :py:func:`shared_process_stats`)
+    :type   shared: bool
+    :param  prewarm: install mystem if needed and start it in background right away,
+                     so that the first call waits only for what is still left of its startup
+    :type   prewarm: bool
+    :param  json_decoder: ``'orjson'``, ``'ujson'``, ``'json'`` or a function which parses
+                          a line of mystem output given as bytes (the fastest installed one by default)
+    :type   json_decoder: str or callable
+    :param  instrument: collect timings and counters of calls, see :py:meth:`stats`
+    :type   instrument: bool
+    :param  on_call: function called with :py:class:`~pymystem3.instrumentation.CallStats`
+                     of every call when it is done (implies `instrument`)
+    :type   on_call: callable
 
     .. note:: Default value of :py:attr:`mystem_bin` can be overwritted by :envvar:`MYSTEM_BIN`.
+
+    .. note:: If you need only lemmas, :py:class:`~pymystem3.lemmatizer.Lemmatizer` is faster.
+
+    .. note:: An instance is thread-safe: calls from several threads are served one at a time
+              by its mystem process. To analyze in parallel, use :py:class:`~pymystem3.pool.MystemPool`.
+
+    .. note:: An instance may be created before fork, e.g. at import time of a prefork
+              server. A child never uses the mystem process of its parent: it starts
+              its own one when needed.
     """
 
     def __init__(
@@ -192,9 +1264,18 @@ class Mystem(object):
         no_bastards=False,
         end_of_sentence=False,
         fixlist=None,
-        use_english_names=False
+        use_english_names=False,
+        cache=None,
+        compact_tokens=False,
+        dedup_words=False,
+        prewarm_after_fork=False,
+        shared=False,
+        prewarm=False,
+        json_decoder=None,
+        instrument=False,
+        on_call=None,
+        max_words=_MAX_WORDS
     ):
-        self._mystem_bin = mystem_bin
         self._grammar_info = grammar_info
         self._disambiguation = disambiguation
         self._entire_input = entire_input
@@ -203,97 +1284,52 @@ class Mystem(object):
         self._generate_all = generate_all
         self._no_bastards = no_bastards
         self._end_of_sentence = end_of_sentence
-        self._fixlist = fixlist
         self._use_english_names = use_english_names
-
-        self._file_path = ""
-        self._procin = None
-        self._procout = None
-        self._procout_no = None
-        self._proc = None
-
-        if self._mystem_bin is None:
-            self._mystem_bin = os.environ.get("MYSTEM_BIN", None)
-
-        if self._mystem_bin is None:
-            autoinstall()
-            self._mystem_bin = MYSTEM_BIN
-
-        self._mystemargs = ["--format", "json"]
-
-        if self._grammar_info:
-            self._mystemargs.append('-i')
-        if self._glue_grammar_info:
-            self._mystemargs.append('-g')
-
-        if self._disambiguation:
-            self._mystemargs.append('-d')
-
-        if self._entire_input:
-            self._mystemargs.append('-c')
-        if self._no_bastards:
-            self._mystemargs.append('-w')
-        if self._end_of_sentence:
-            self._mystemargs.append('-s')
-
-        if self._weight:
-            self._mystemargs.append('--weight')
-
-        if self._generate_all:
-            self._mystemargs.append('--generate-all')
-
-        if self._fixlist is not None:
-            self._mystemargs.append('--fixlist')
-            self._mystemargs.append(self._fixlist)
-
-        if self._use_english_names:
-            self._mystemargs.append('--eng-gr')
-
-    def __del__(self):
-        self.close()  # terminate process on exit
-
-    def __enter__(self):
-        if self._proc is None:
-            self.start()
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
-
-    def start(self):
-        """
-        Run mystem binary.
-
-        .. note:: It is not mandatory to call it. Use it if you want to avoid waiting for mystem loads.
+        self._token_factory = _TokenFactory() if compact_tokens else None
+        self._json_loads = json_decoder if callable(json_decoder) else _get_json_decoder(json_decoder)
+        self._dedup_words = dedup_words
+        self._max_words = max_words
+        self.vocabulary = {}
+        self._instrumentation = _Instrumentation(on_call) if instrument or on_call is not None else None
+
+        if self._dedup_words and (self._disambiguation or self._end_of_sentence):
+            raise ValueError("dedup_words works only with disambiguation=False and end_of_sentence=False")
+
+        super(Mystem, self).__init__(mystem_bin=mystem_bin, fixlist=fixlist, cache=cache, shared=shared,
+                                     prewarm=prewarm, prewarm_after_fork=prewarm_after_fork)
+
+    def _build_mystem_args(self):
+        """ Build mystem command line arguments for options of the instance. """
+        return _get_mystem_args(
+            grammar_info=self._grammar_info,
+            disambiguation=self._disambiguation,
+            entire_input=self._entire_input,
+            glue_grammar_info=self._glue_grammar_info,
+            weight=self._weight,
+            generate_all=self._generate_all,
+            no_bastards=self._no_bastards,
+            end_of_sentence=self._end_of_sentence,
+            fixlist=self._fixlist,
+            use_english_names=self._use_english_names,
+        )
+
+    def stats(self):
         """
+        Return totals of all calls since the instance was created, or None without `instrument`.
 
-        self._start_mystem()
-
-    def close(self):
-        if self._proc is not None:
-            self._proc.terminate()  # Send TERM signal to process
-            self._procin.close()  # Then close stdin
-            self._procout.close()  # And stdout
-            self._proc.wait()  # Finally wait for terminaion
-
-        self._procin = None
-        self._procout = None
-        self._procout_no = None
-        self._proc = None
+        Besides the number of ``calls``, there are sums of the fields of
+        :py:class:`~pymystem3.instrumentation.CallStats`: ``lines`` and ``tokens``
+        produced, ``bytes_in`` sent to mystem and ``bytes_out`` received,
+        ``cache_hits``, ``restarts`` of mystem, and times in seconds spent
+        writing to mystem (``write_time``), waiting for it (``wait_time``),
+        reading (``read_time``) and parsing (``parse_time``) its output, and in total.
 
-    def _start_mystem(self):
-        Mystem_args = [self._mystem_bin] + self._mystemargs
-        if self._file_path:
-            Mystem_args.append(self._file_path)
-        self._proc = subprocess.Popen(Mystem_args,
-                                      stdin=subprocess.PIPE,
-                                      stdout=subprocess.PIPE,
-                                      bufsize=0,
-                                      close_fds=True if _POSIX else False)
+        :rtype: dict
+        """
 
-        self._procin, self._procout = self._proc.stdin, self._proc.stdout
-        self._procout_no = self._procout.fileno()
-        _set_non_blocking(self._procout)
+        if self._instrumentation is None:
+            return None
+        return self._instrumentation.snapshot()
 
     def analyze(self, text='', file_path=None):
         """
@@ -308,21 +1344,7 @@ class Mystem(object):
         :rtype:         dict
         """
 
-        result = []
-        self._file_path = file_path
-
-        if self._file_path:
-            # file path will be used and passed to mystem.exe
-            result.extend(self._analyze_impl(''))
-        else:
-            for line in text.splitlines():
-                try:
-                    result.extend(self._analyze_impl(line))
-                except broken_pipe:
-                    self.close()
-                    self.start()
-                    result.extend(self._analyze_impl(line))
-        return result
+        return self._analyze_text(text, file_path, 'analyze')
 
     def lemmatize(self, text='', file_path=None):
         """
@@ -347,59 +1369,186 @@ class Mystem(object):
 
         return lemmas
 
-    if _PIPELINE_MODE:
-        def _analyze_impl(self, text):
-            if isinstance(text, unicode):
-                text = text.encode('utf-8')
+    def analyze_many(self, docs, max_inflight=_MAX_INFLIGHT):
+        """
+        Make morphology analysis for many texts at once.
+
+        Lines of all texts are streamed through one mystem process, so a lot of
+        short texts cost much less than calling :py:meth:`analyze` for each of them.
+        mystem answers every input line with exactly one output line, so results
+        are split back by the number of lines in each text and no boundary
+        markers are needed. The results are the same as of :py:meth:`analyze`.
+
+        :type   docs:   iterable
+        :param  docs:   texts to analyze
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :returns:       list of results of morphology analysis, one per text
+        :rtype:         list
+        """
 
-            if self._proc is None:
-                self._start_mystem()
+        return self._analyze_docs(docs, max_inflight, 'analyze_many')
 
-            if not self._file_path:
-                self._procin.write(text)
-                self._procin.write(_NL)
-                self._procin.flush()
-
-            sio = StringIO()
-            out = None
-            obj = None
-            select.select([self._procout_no], [], [])
-            while True:
-                try:
-                    out = self._procout.read()
-                    sio.write(out)
-                    out = sio.getvalue().decode('utf-8')
-                    obj = self._process_json_output(out)
-                    break
-                except (IOError, ValueError):
-                    rd, _, _ = select.select([self._procout_no], [], [], 30)
-                    if self._procout_no not in rd:
-                        raise RuntimeError("Problem has been occured. Current state:\ntext:\n%r\nout:\n%r\nsio:\n%r" %
-                                           (text[0:2000], out[0:2000], sio.getvalue()))
+    def lemmatize_many(self, docs, max_inflight=_MAX_INFLIGHT):
+        """
+        Make morphology analysis for many texts at once and return lists of lemmas.
+        See :py:meth:`analyze_many`.
+
+        :type   docs:   iterable
+        :param  docs:   texts to analyze
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :returns:       list of lists of lemmas, one per text
+        :rtype:         list
+        """
 
-            return obj
-    else:
-        def _analyze_impl(self, text):
-            if isinstance(text, unicode):
-                text = text.encode('utf-8')
+        docs = list(docs)
+        results = []
+        for doc, infos in izip(docs, self.analyze_many(docs, max_inflight)):
+            lemmas = list(ifilter(None, imap(self._get_lemma, infos)))
+            if sys.version_info[0] < 3 and isinstance(doc, str):
+                lemmas = [l.encode('utf-8') for l in lemmas]
+            results.append(lemmas)
+        return results
 
-            if self._proc is None:
-                self._start_mystem()
+    def iter_analyze(self, lines=None, max_inflight=_MAX_INFLIGHT, file_path=None):
+        """
+        Make morphology analysis for a stream of lines and yield tokens as soon as they are ready.
 
-            if not self._file_path:
-                self._procin.write(text)
-                self._procin.write(_NL)
+        Unlike :py:meth:`analyze`, the whole input and result never have to fit in memory:
+        at most `max_inflight` lines are sent to mystem before their results are read.
 
-            out, _ = self._proc.communicate()
-            self._proc = None
-            try:
-                out = out.decode('utf-8')
-                obj = self._process_json_output(out)
-            except (IOError, ValueError):
-                raise RuntimeError("Problem has been occured. Current state:\ntext:\n%r\nout:\n%r" %
-                                   (text[0:2000], out[0:2000]))
+        :type   lines:  iterable
+        :param  lines:  lines to analyze, e.g. an open file; a string is split into lines
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, lines of the utf8 text file at file_path are analyzed.
+                           Argument lines is not used in this case.
+        :returns:       iterator over results of morphology analysis
+        :rtype:         iterator
 
-            return obj
+        .. note:: Other threads can not use the instance until the iterator is exhausted or closed.
+        """
+
+        return self._iter_analyze(lines, max_inflight, file_path, 'iter_analyze')
+
+    def iter_lemmatize(self, lines=None, max_inflight=_MAX_INFLIGHT, file_path=None):
+        """
+        Make morphology analysis for a stream of lines and yield lemmas as soon as they are ready.
+        See :py:meth:`iter_analyze`.
+
+        :type   lines:  iterable
+        :param  lines:  lines to analyze, e.g. an open file; a string is split into lines
+        :type   max_inflight: int
+        :param  max_inflight: maximum number of lines sent to mystem and not yet answered
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, lines of the utf8 text file at file_path are analyzed.
+                           Argument lines is not used in this case.
+        :returns:       iterator over lemmas
+        :rtype:         iterator
+        """
+
+        return ifilter(None, imap(self._get_lemma, self.iter_analyze(lines, max_inflight, file_path)))
+
+    def _analyze(self, lines, max_inflight, method):
+        """
+        Analyze lines and yield the list of tokens of every line in input order.
+        With instrumentation the call is recorded as `method`.
+        """
+
+        analyze_lines = self._analyze_deduplicated if self._dedup_words else self._analyze_lines
+        if self._instrumentation is None:
+            return analyze_lines(lines, max_inflight)
+        return self._analyze_instrumented(analyze_lines(lines, max_inflight), method)
+
+    def _analyze_instrumented(self, objs, method):
+        call = self._call = CallStats(method)
+        start = _clock()
+        try:
+            for obj in objs:
+                call.lines += 1
+                call.tokens += len(obj)
+                yield obj
+        finally:
+            call.total_time = _clock() - start
+            self._call = None
+            self._instrumentation.record(call)
+
+    def _analyze_deduplicated(self, lines, max_inflight=None):
+        """
+        Analyze lines word by word, sending every distinct word form to mystem only once.
+        Yield the list of tokens of every line in input order.
+
+        Without disambiguation the analysis of a word does not depend on its context.
+        So lines are split into words and separators here, the words which are not
+        in :py:attr:`vocabulary` yet are sent to mystem one per line, and the result
+        of every line is built from the vocabulary. Lines are processed in batches
+        of `max_inflight` lines (all at once if it is None). If the new words of a batch
+        do not fit in `max_words`, the vocabulary is cleared and filled with the words
+        of the batch, so it may exceed the limit only by the words of one batch.
+        """
+
+        lines = iter(lines)
+        vocabulary = self.vocabulary
+        batch = list(islice(lines, max_inflight))
+        while batch:
+            batch = [l.decode('utf-8') if isinstance(l, bytes) else l for l in batch]
+
+            batch_words = set()
+            for line in batch:
+                batch_words.update(_WORD_RE.findall(line))
+            words = [word for word in batch_words if word not in vocabulary]
+            if self._max_words is not None and len(vocabulary) + len(words) > self._max_words:
+                vocabulary.clear()
+                words = list(batch_words)
+
+            for word, obj in izip(words, self._analyze_lines(words, max_inflight)):
+                if self._entire_input and obj and obj[-1].get('text') == _NL_TEXT:
+                    obj.pop()
+                vocabulary[word] = obj
+
+            for line in batch:
+                yield self._build_line(line)
+            batch = list(islice(lines, max_inflight))
+
+    def _build_line(self, line):
+        """
+        Build result of analysis of a line from :py:attr:`vocabulary`.
+        Tokens are copied, so they may be changed without harm to the vocabulary.
+        """
+
+        obj = []
+        pos = 0
+        for match in _WORD_RE.finditer(line):
+            if self._entire_input and match.start() > pos:
+                obj.append(self._separator(line[pos:match.start()]))
+            obj.extend(imap(_copy_token, self.vocabulary[match.group()]))
+            pos = match.end()
+
+        if self._entire_input:
+            if pos < len(line):
+                obj.append(self._separator(line[pos:]))
+            obj.append(self._separator(_NL_TEXT))
+        return obj
+
+    def _separator(self, text):
+        if self._token_factory is not None:
+            return Token(self._token_factory.string(text))
+        return {'text': text}
+
+    def _decode(self, record):
+        """
+        Parse mystem output for a line into a list of tokens.
+        """
+
+        obj = self._json_loads(record)
+        if self._token_factory is not None:
+            obj = self._token_factory.tokens(obj)
+        return obj
+
+    def _lemmas(self, obj):
+        return list(ifilter(None, imap(self._get_lemma, obj)))
 
     @staticmethod
     def _get_lemma(o):
@@ -424,10 +1573,11 @@ class Mystem(object):
         Delete all empty lines and join json output into one line
         Line breaks occur if the file path goes to the analysis function (file_path parameter is used)
         """
+        loads = ujson.loads if ujson is not None else json.loads
         obj = []
         for line in out.split('\n'):   # really, on windows separator is '\r\n', but that is not a problem
             if line:
-                obj.extend(json.loads(line))
+                obj.extend(loads(line))
         return obj
 
     @staticmethod
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+A pool of warm mystem processes to use all CPU cores.
+"""
+
+from __future__ import print_function
+
+import collections
+import io
+import mmap
+import multiprocessing
+import os
+import threading
+from itertools import imap
+
+from Queue import Queue
+
+from .mystem import Mystem
+
+#: size of a piece of a file analyzed by one process at a time, in bytes
+_SHARD_SIZE = 1024 * 1024
+
+
+class _Job(object):
+
+    """
+    Unit of work for a pool worker: a function to call with a worker's
+    :py:class:`~pymystem3.mystem.Mystem`, and a place to put its result.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self, mystem):
+        try:
+            self.result = self.func(mystem)
+        except BaseException as e:
+            # the caller waits for the job, so it must be done whatever happens
+            self.error = e
+        finally:
+            self.done.set()
+
+    def get(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _worker(mystem, jobs):
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job.run(mystem)
+    mystem.close()
+
+
+def _analyze_chunk(lines):
+    # The trailing newline keeps empty lines at the end of the chunk.
+    text = '\n'.join(lines) + '\n'
+    return lambda mystem: mystem.analyze(text)
+
+
+def _lemmatize_chunk(lines):
+    text = '\n'.join(lines) + '\n'
+    return lambda mystem: mystem.lemmatize(text)
+
+
+def _iter_shards(data, shard_size):
+    """
+    Cut `data` (e.g. a memory-mapped file) into ``(start, end)`` byte ranges
+    of about `shard_size` bytes, which end at line boundaries.
+    """
+
+    if shard_size < 1:
+        raise ValueError("shard_size must be at least 1, got %r" % (shard_size,))
+    size = len(data)
+    start = 0
+    while start < size:
+        end = data.find(b'\n', min(start + shard_size, size) - 1)
+        end = size if end < 0 else end + 1
+        yield start, end
+        start = end
+
+
+class MystemPool(object):
+
+    """
+    Run several mystem processes and spread the work over them.
+
+    Lines of a text are split into contiguous chunks, one per process,
+    and the results are joined back in input order. Each process is driven
+    by its own thread, and all processes are started in the initializer,
+    so the dictionaries are loaded only once per process.
+
+    The pool may be shared by several threads.
+
+    :param  size: number of mystem processes (number of CPUs by default)
+    :type   size: int
+    :param  mystem_class: class of workers, e.g. :py:class:`~pymystem3.lemmatizer.Lemmatizer`
+                          to lemmatize faster (then only lemmatize methods may be used)
+    :type   mystem_class: type
+
+    All other keyword arguments are passed to `mystem_class`.
+    """
+
+    # so that __del__ works if __init__ fails before starting workers
+    _threads = ()
+
+    def __init__(self, size=None, mystem_class=Mystem, **mystem_options):
+        if size is None:
+            size = multiprocessing.cpu_count()
+        if size < 1:
+            raise ValueError("Pool size must be positive, got %r" % size)
+
+        self._threads = []
+        self._size = size
+        self._mystem_class = mystem_class
+        self._jobs = Queue()
+
+        # start processes here, so that an error, e.g. a wrong mystem_bin, reaches the caller
+        workers = []
+        try:
+            for _ in range(size):
+                mystem = mystem_class(**mystem_options)
+                workers.append(mystem)
+                mystem.start()
+        except Exception:
+            for mystem in workers:
+                mystem.close()
+            raise
+
+        for mystem in workers:
+            thread = threading.Thread(target=_worker, args=(mystem, self._jobs))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def size(self):
+        """ Number of mystem processes. """
+        return self._size
+
+    def close(self):
+        """ Stop all workers and terminate their mystem processes. """
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _require(self, method):
+        # fail in the caller, not in a worker
+        if not hasattr(self._mystem_class, method):
+            raise TypeError("%s has no %s method" % (self._mystem_class.__name__, method))
+
+    def _submit(self, func):
+        if not self._threads:
+            raise RuntimeError("MystemPool is closed")
+        job = _Job(func)
+        self._jobs.put(job)
+        return job
+
+    def analyze(self, text='', file_path=None):
+        """
+        Make morphology analysis for a text.
+
+        The same as :py:meth:`Mystem.analyze <pymystem3.mystem.Mystem.analyze>`,
+        but lines of the text are analyzed by all processes of the pool at once.
+
+        :type   text:   str
+        :param  text:   text to analyze
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, file_path will be used to open utf8 text file for analysis.
+                           Argument text is not used in this case.
+        :returns:       result of morphology analysis.
+        :rtype:         dict
+        """
+
+        self._require('analyze')
+        if file_path:
+            return self._submit(lambda mystem: mystem.analyze(file_path=file_path)).get()
+        return self._map_chunks(text.splitlines(), _analyze_chunk)
+
+    def _map_chunks(self, items, make_job):
+        """
+        Split items into contiguous chunks, one per process, run a job
+        made by `make_job` for every chunk and join their results in order.
+        """
+
+        if not items:
+            return []
+
+        chunk_size = (len(items) + self._size - 1) // self._size
+        jobs = [self._submit(make_job(items[i:i + chunk_size]))
+                for i in range(0, len(items), chunk_size)]
+
+        result = []
+        for job in jobs:
+            result.extend(job.get())
+        return result
+
+    def lemmatize(self, text='', file_path=None):
+        """
+        Make morphology analysis for a text and return list of lemmas.
+
+        The same as :py:meth:`Mystem.lemmatize <pymystem3.mystem.Mystem.lemmatize>`,
+        but lines of the text are analyzed by all processes of the pool at once.
+
+        :type   text:   str
+        :param  text:   text to analyze
+        :type   file_path: str
+        :param  file_path: alternative mode: if defined, file_path will be used to open utf8 text file for analysis.
+                           Argument text is not used in this case.
+        :returns:       list of lemmas
+        :rtype:         list
+        """
+
+        if file_path:
+            return self._submit(lambda mystem: mystem.lemmatize(file_path=file_path)).get()
+        return self._map_chunks(text.splitlines(), _lemmatize_chunk)
+
+    def analyze_many(self, docs):
+        """
+        Make morphology analysis for many texts at once.
+
+        The same as :py:meth:`Mystem.analyze_many <pymystem3.mystem.Mystem.analyze_many>`,
+        but texts are analyzed by all processes of the pool at once.
+
+        :type   docs:   iterable
+        :param  docs:   texts to analyze
+        :returns:       list of results of morphology analysis, one per text
+        :rtype:         list
+        """
+
+        self._require('analyze_many')
+        return self._map_chunks(list(docs), lambda chunk: lambda mystem: mystem.analyze_many(chunk))
+
+    def lemmatize_many(self, docs):
+        """
+        Make morphology analysis for many texts at once and return lists of lemmas.
+        See :py:meth:`analyze_many`.
+
+        :type   docs:   iterable
+        :param  docs:   texts to analyze
+        :returns:       list of lists of lemmas, one per text
+        :rtype:         list
+        """
+
+        return self._map_chunks(list(docs), lambda chunk: lambda mystem: mystem.lemmatize_many(chunk))
+
+    def _analyze_as_lines(self, lines, method):
+        """ See :py:meth:`Mystem._analyze_as_lines <pymystem3.mystem.Mystem._analyze_as_lines>`. """
+        return self._map_chunks(list(lines), lambda chunk: lambda mystem: mystem._analyze_as_lines(chunk, method))
+
+    def analyze_file(self, path, sink=None, shard_size=_SHARD_SIZE):
+        """
+        Make morphology analysis for a big utf8 text file with all processes of the pool.
+
+        The file is memory-mapped and cut into shards of about `shard_size` bytes
+        at line boundaries, and shards are analyzed by all processes at once.
+        Results come in input order, and only a few shards per process are kept
+        in memory, no matter how big the file is.
+
+        :type   path:   str
+        :param  path:   path to the file
+        :type   sink:   callable
+        :param  sink:   if given, it is called with the list of tokens of every shard, in order
+        :type   shard_size: int
+        :param  shard_size: approximate size of a shard in bytes
+        :returns:       iterator over results of morphology analysis, or the number of tokens if `sink` is given
+        :rtype:         iterator or int
+        """
+
+        return self._file(path, 'analyze', sink, shard_size)
+
+    def lemmatize_file(self, path, sink=None, shard_size=_SHARD_SIZE):
+        """
+        Make morphology analysis for a big utf8 text file with all processes of the pool
+        and return lemmas. See :py:meth:`analyze_file`.
+
+        :type   path:   str
+        :param  path:   path to the file
+        :type   sink:   callable
+        :param  sink:   if given, it is called with the list of lemmas of every shard, in order
+        :type   shard_size: int
+        :param  shard_size: approximate size of a shard in bytes
+        :returns:       iterator over lemmas, or the number of lemmas if `sink` is given
+        :rtype:         iterator or int
+        """
+
+        return self._file(path, 'lemmatize', sink, shard_size)
+
+    def _file(self, path, method, sink, shard_size):
+        self._require(method)
+        results = self._iter_file_shards(path, method, shard_size)
+        if sink is None:
+            return (item for items in results for item in items)
+
+        count = 0
+        for items in results:
+            sink(items)
+            count += len(items)
+        return count
+
+    def _iter_file_shards(self, path, method, shard_size):
+        """
+        Yield results of `method` of :py:class:`~pymystem3.mystem.Mystem`
+        for shards of the file in order, at most two shards per process ahead.
+        """
+
+        with io.open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        pending = collections.deque()
+        try:
+            for start, end in _iter_shards(data, shard_size):
+                pending.append(self._submit(_shard_job(data, start, end, method)))
+                if len(pending) >= 2 * self._size:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            # workers may still read the mapping
+            for job in pending:
+                job.done.wait()
+            data.close()
+
+
+def _split_lines(data):
+    """
+    Split bytes into lines at ``\\n`` only, as :py:func:`~pymystem3.mystem._read_file_lines`
+    does for :py:meth:`Mystem.analyze <pymystem3.mystem.Mystem.analyze>` with `file_path`.
+    """
+
+    lines = data.split(b'\n')
+    if not lines[-1]:
+        lines.pop()
+    return [line.rstrip(b'\r\n') for line in lines]
+
+
+def _shard_job(data, start, end, method):
+    def job(mystem):
+        results = mystem._analyze_as_lines(_split_lines(data[start:end]), method)
+        if method == 'lemmatize':
+            results = imap(mystem._lemmas, results)
+        return [item for result in results for item in result]
+    return job
+
+
+def analyze_file_parallel(path, workers=None, sink=None, shard_size=_SHARD_SIZE, **mystem_options):
+    """
+    Make morphology analysis for a big utf8 text file with a temporary
+    :py:class:`MystemPool` of `workers` processes. See :py:meth:`MystemPool.analyze_file`.
+
+    :type   path:   str
+    :param  path:   path to the file
+    :type   workers: int
+    :param  workers: number of mystem processes (number of CPUs by default)
+    :type   sink:   callable
+    :param  sink:   if given, it is called with the list of tokens of every shard, in order
+    :type   shard_size: int
+    :param  shard_size: approximate size of a shard in bytes
+    :returns:       iterator over results of morphology analysis, or the number of tokens if `sink` is given
+    :rtype:         iterator or int
+
+    All other keyword arguments are passed to :py:class:`MystemPool`.
+    """
+
+    pool = MystemPool(size=workers, **mystem_options)
+    if sink is not None:
+        try:
+            return pool.analyze_file(path, sink, shard_size)
+        finally:
+            pool.close()
+    return _closing_iter(pool, pool.analyze_file(path, shard_size=shard_size))
+
+
+def _closing_iter(pool, items):
+    try:
+        for item in items:
+            yield item
+    finally:
+        pool.close()
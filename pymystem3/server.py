@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+A local analysis daemon which keeps warm mystem processes for short-lived clients.
+
+Run it as ``python -m pymystem3 serve --socket /tmp/mystem.sock`` (or ``--port``)
+and use :py:class:`MystemClient` instead of :py:class:`~pymystem3.mystem.Mystem`,
+so that scripts which analyze a few strings do not wait for mystem to start.
+
+The protocol is JSON Lines over a Unix socket or a localhost TCP connection:
+a request is ``{"id": 1, "method": "lemmatize", "text": "..."}`` (``docs`` instead
+of ``text`` for ``analyze_many`` and ``lemmatize_many``, nothing for ``stats``),
+a response is ``{"id": 1, "result": ...}`` or ``{"id": 1, "error": "..."}``.
+Requests may be pipelined: a client may send many of them before reading
+the responses, which come in the same order.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import errno
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from Queue import Queue
+from SocketServer import (StreamRequestHandler, TCPServer, ThreadingMixIn)
+
+try:
+    from SocketServer import UnixStreamServer
+except ImportError:  # no Unix sockets, e.g. on Windows
+    UnixStreamServer = None
+
+from .pool import MystemPool
+
+_STATS_WINDOW = 1000
+
+
+def _dumps(obj):
+    s = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    return s + b'\n'
+
+
+def _loads(line):
+    return json.loads(line.decode('utf-8'))
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+class _Stats(object):
+
+    """
+    Server-side request counters and timings, in seconds.
+
+    Queueing time is the time from receipt of a request to start of its processing,
+    latency is the time from its receipt to sending the response. Percentiles are
+    computed over the last `window` requests.
+    """
+
+    def __init__(self, window=_STATS_WINDOW):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.latency = 0.0
+        self._latencies = collections.deque(maxlen=window)
+
+    def record(self, queue_time, latency, error):
+        with self._lock:
+            self.requests += 1
+            self.errors += bool(error)
+            self.queue_time += queue_time
+            self.max_queue_time = max(self.max_queue_time, queue_time)
+            self.latency += latency
+            self._latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            n = self.requests or 1
+            latencies = list(self._latencies)
+            return {
+                'uptime': time.time() - self.started,
+                'requests': self.requests,
+                'errors': self.errors,
+                'queue_time_avg': self.queue_time / n,
+                'queue_time_max': self.max_queue_time,
+                'latency_avg': self.latency / n,
+                'latency_p50': _percentile(latencies, 50),
+                'latency_p99': _percentile(latencies, 99),
+            }
+
+
+class _Handler(StreamRequestHandler):
+
+    """
+    Serve a connection: read requests as they come and answer them in order
+    in another thread, so that pipelined requests wait in a queue, not in a socket buffer.
+    """
+
+    def handle(self):
+        requests = Queue()
+        responder = threading.Thread(target=self._respond, args=(requests,))
+        responder.daemon = True
+        responder.start()
+        try:
+            for line in iter(self.rfile.readline, b''):
+                if line.strip():
+                    requests.put((time.time(), line))
+        finally:
+            requests.put(None)
+            responder.join()
+
+    def _respond(self, requests):
+        server = self.server
+        broken = False
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            if broken:
+                continue  # the client is gone, just drain the queue
+
+            received, line = item
+            started = time.time()
+            response = server.execute(line)
+            try:
+                self.wfile.write(_dumps(response))
+                self.wfile.flush()
+            except (IOError, OSError, socket.error):
+                broken = True
+            server.stats.record(started - received, time.time() - received, 'error' in response)
+
+
+class _ThreadingTCPServer(ThreadingMixIn, TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if UnixStreamServer is not None:
+    class _ThreadingUnixServer(ThreadingMixIn, UnixStreamServer):
+        daemon_threads = True
+
+
+class MystemServer(object):
+
+    """
+    Analysis daemon: a :py:class:`~pymystem3.pool.MystemPool` of warm mystem
+    processes served over a Unix socket or a TCP port.
+
+    :param  address: path of a Unix socket, or a ``(host, port)`` tuple for TCP
+                     (port 0 picks a free one, see :py:attr:`address`)
+    :type   address: str or tuple
+    :param  size: number of mystem processes (number of CPUs by default)
+    :type   size: int
+
+    All other keyword arguments are passed to :py:class:`~pymystem3.mystem.Mystem`.
+    """
+
+    def __init__(self, address, size=None, **mystem_options):
+        self.pool = MystemPool(size=size, **mystem_options)
+        self.stats = _Stats()
+
+        if isinstance(address, basestring):
+            _remove_stale_socket(address)
+            self._server = _ThreadingUnixServer(address, _Handler)
+        else:
+            self._server = _ThreadingTCPServer(tuple(address), _Handler)
+        self._server.execute = self.execute
+        self._server.stats = self.stats
+
+        self._methods = {
+            'analyze': lambda request: self.pool.analyze(request['text']),
+            'lemmatize': lambda request: self.pool.lemmatize(request['text']),
+            'analyze_many': lambda request: self.pool.analyze_many(request['docs']),
+            'lemmatize_many': lambda request: self.pool.lemmatize_many(request['docs']),
+            'stats': lambda request: self.get_stats(),
+        }
+
+    @property
+    def address(self):
+        """ Address the server listens on. """
+        return self._server.server_address
+
+    def get_stats(self):
+        """
+        Return server-side counters: number of requests and errors, queueing
+        time and latency in seconds (see :py:class:`_Stats`), and pool size.
+
+        :rtype: dict
+        """
+
+        stats = self.stats.snapshot()
+        stats['processes'] = self.pool.size
+        return stats
+
+    def execute(self, line):
+        """ Execute a request line and return the response. """
+
+        request_id = None
+        try:
+            request = _loads(line)
+            request_id = request.get('id')
+            method = self._methods.get(request.get('method'))
+            if method is None:
+                raise ValueError("Unknown method %r" % request.get('method'))
+            return {'id': request_id, 'result': method(request)}
+        except Exception as e:
+            return {'id': request_id, 'error': '%s: %s' % (type(e).__name__, e)}
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """ Stop :py:meth:`serve_forever` running in another thread. """
+        self._server.shutdown()
+
+    def close(self):
+        """ Close the socket and terminate mystem processes. """
+        self._server.server_close()
+        if isinstance(self.address, basestring) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _remove_stale_socket(path):
+    """ Remove a socket file left by a dead server, but not one in use. """
+
+    if not os.path.exists(path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error as e:
+        if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+            os.unlink(path)
+            return
+        raise
+    finally:
+        sock.close()
+    raise RuntimeError("Another server is running on %s" % path)
+
+
+class MystemClient(object):
+
+    """
+    Client of :py:class:`MystemServer` with the same API as :py:class:`~pymystem3.mystem.Mystem`.
+
+    The client may be shared by several threads. If the connection fails
+or times out, it is closed, and the next call connects again.
+
+    :param  address: path of a Unix socket, or a ``(host, port)`` tuple for TCP
+    :type   address: str or tuple
+    :param  timeout: socket timeout in seconds
+    :type   timeout: float
+    """
+
+    def __init__(self, address, timeout=None):
+        self._address = address if isinstance(address, basestring) else tuple(address)
+        self._timeout = timeout
+        self._sock = None
+        self._rfile = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._connect()
+
+    def _connect(self):
+        if isinstance(self._address, basestring):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        try:
+            sock.connect(self._address)
+        except socket.error:
+            sock.close()
+            raise
+        self._sock = sock
+        self._rfile = sock.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+            self._sock = None
+            self._rfile = None
+
+    def call_many(self, requests):
+        """
+        Send requests at once and return their results in order.
+
+        :type   requests: list
+        :param  requests: list of ``(method, params)`` tuples, where params is a dict,
+                          e.g. ``('lemmatize', {'text': 'мама'})``
+        :returns: list of results
+        :rtype:   list
+        """
+
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            first_id = self._next_id
+            self._next_id += len(requests)
+            payload = []
+            for i, (method, params) in enumerate(requests):
+                request = dict(params)
+                request['id'] = first_id + i
+                request['method'] = method
+                payload.append(_dumps(request))
+
+            # all responses are read before any error is raised, so that none
+            # of them is left in the socket to be taken for a response to the next call
+            try:
+                self._sock.sendall(b''.join(payload))
+                responses = [self._read_response(first_id + i) for i in range(len(requests))]
+            except (IOError, socket.error, ValueError):
+                self.close()
+                raise
+
+            for response in responses:
+                if 'error' in response:
+                    raise RuntimeError(response['error'])
+            return [response['result'] for response in responses]
+
+    def _read_response(self, request_id):
+        line = self._rfile.readline()
+        if not line:
+            raise IOError("Server has closed the connection")
+        response = _loads(line)
+        if response.get('id') != request_id:
+            raise IOError("Unexpected response %r" % response.get('id'))
+        return response
+
+    def analyze(self, text):
+        """ See :py:meth:`Mystem.analyze <pymystem3.mystem.Mystem.analyze>`. """
+        return self.call_many([('analyze', {'text': _to_text(text)})])[0]
+
+    def lemmatize(self, text):
+        """ See :py:meth:`Mystem.lemmatize <pymystem3.mystem.Mystem.lemmatize>`. """
+        return _like(text, self.call_many([('lemmatize', {'text': _to_text(text)})])[0])
+
+    def analyze_many(self, docs, batch_size=1000):
+        """
+        See :py:meth:`Mystem.analyze_many <pymystem3.mystem.Mystem.analyze_many>`.
+        Texts are sent in pipelined requests of `batch_size` texts.
+        """
+        return self._many('analyze_many', list(docs), batch_size)
+
+    def lemmatize_many(self, docs, batch_size=1000):
+        """
+        See :py:meth:`Mystem.lemmatize_many <pymystem3.mystem.Mystem.lemmatize_many>`.
+        Texts are sent in pipelined requests of `batch_size` texts.
+        """
+        docs = list(docs)
+        return [_like(doc, lemmas) for doc, lemmas in zip(docs, self._many('lemmatize_many', docs, batch_size))]
+
+    def stats(self):
+        """ Return server-side stats, see :py:meth:`MystemServer.get_stats`. """
+        return self.call_many([('stats', {})])[0]
+
+    def _many(self, method, docs, batch_size):
+        requests = [(method, {'docs': [_to_text(doc) for doc in docs[i:i + batch_size]]})
+                    for i in range(0, len(docs), batch_size)]
+        results = []
+        for batch in self.call_many(requests):
+            results.extend(batch)
+        return results
+
+
+def _to_text(text):
+    return text.decode('utf-8') if isinstance(text, bytes) else text
+
+
+def _like(text, lemmas):
+    # as Mystem.lemmatize, return byte strings for byte strings on Python 2
+    if sys.version_info[0] < 3 and isinstance(text, str):
+        return [l.encode('utf-8') for l in lemmas]
+    return lemmas
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m pymystem3 serve',
+                                     description="Serve mystem analysis to local clients.")
+    parser.add_argument('--socket', help="path of a Unix socket to listen on")
+    parser.add_argument('--host', default='127.0.0.1', help="host to listen on with --port (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, help="TCP port to listen on")
+    parser.add_argument('-j', '--jobs', type=int, help="number of mystem processes (default: number of CPUs)")
+    parser.add_argument('--mystem-bin', help="path to mystem binary")
+    options = parser.parse_args(args)
+    if (options.socket is None) == (options.port is None):
+        parser.error("exactly one of --socket and --port is required")
+
+    address = options.socket if options.socket is not None else (options.host, options.port)
+    with MystemServer(address, size=options.jobs, mystem_bin=options.mystem_bin) as server:
+        print("Serving on %s" % (server.address,), file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Compact representation of mystem analysis results.
+
+By default tokens are the dicts decoded from mystem JSON output. For big
+corpora they take a lot of memory, so :py:class:`~pymystem3.mystem.Mystem`
+may return :py:class:`Token` and :py:class:`Analysis` objects instead
+(see its `compact_tokens` option). Both have ``__slots__``, strings in them
+are interned, and equal analyses are shared by all tokens.
+
+The table of shared analyses grows with the vocabulary of the analyzed text,
+so it is cleared when it reaches :py:data:`MAX_ENTRIES` entries; tokens made
+before keep their analyses, later ones get new copies.
+
+They support read access of dicts, e.g. ``token['analysis'][0]['lex']``,
+``token.get('analysis')`` and ``'analysis' in token``, so they work with
+:py:meth:`Mystem.get_pos <pymystem3.mystem.Mystem.get_pos>` and
+:py:meth:`Mystem.get_printable_repr <pymystem3.mystem.Mystem.get_printable_repr>`.
+"""
+
+try:
+    from sys import intern as _intern
+except ImportError:
+    # Python 2 interns only byte strings
+    _intern = None
+
+#: default limit of the number of shared analyses (and strings on Python 2)
+MAX_ENTRIES = 100000
+
+
+class _Mapping(object):
+
+    """
+    Dict-like read access to slots. A slot set to None is treated as a missing key.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def keys(self):
+        return [key for key in self.__slots__ if getattr(self, key) is not None]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % (k, getattr(self, k)) for k in self.keys()))
+
+
+class Analysis(_Mapping):
+
+    """
+    A hypothesis of analysis of a word.
+
+    Analyses are shared between tokens, so they are immutable.
+
+    :param  lex: lemma
+    :param  gr: grammemes
+    :param  qual: quality, e.g. ``'bastard'`` for non-dictionary words
+    :param  wt: context-independent lemma weight
+    """
+
+    __slots__ = ('lex', 'gr', 'qual', 'wt')
+
+    def __init__(self, lex, gr=None, qual=None, wt=None):
+        set_attr = super(Analysis, self).__setattr__
+        set_attr('lex', lex)
+        set_attr('gr', gr)
+        set_attr('qual', qual)
+        set_attr('wt', wt)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Analysis is immutable")
+
+    def __hash__(self):
+        return hash((self.lex, self.gr, self.qual, self.wt))
+
+    def as_dict(self):
+        """ Return the analysis as a dict, in the same form as mystem JSON output. """
+        return dict((k, getattr(self, k)) for k in self.keys())
+
+
+class Token(_Mapping):
+
+    """
+    A token of mystem output: a word with a tuple of its analyses,
+    or a separator, for which `analysis` is None.
+
+    :param  text: text of the token
+    :param  analysis: tuple of :py:class:`Analysis`
+    """
+
+    __slots__ = ('text', 'analysis')
+
+    def __init__(self, text, analysis=None):
+        self.text = text
+        self.analysis = analysis
+
+    __hash__ = None
+
+    def copy(self):
+        """ Return a copy of the token. Analyses are immutable and are not copied. """
+        return Token(self.text, self.analysis)
+
+    def as_dict(self):
+        """ Return the token as a dict, in the same form as mystem JSON output. """
+        token = {'text': self.text}
+        if self.analysis is not None:
+            token['analysis'] = [a.as_dict() for a in self.analysis]
+        return token
+
+
+class _TokenFactory(object):
+
+    """
+    Convert tokens decoded from mystem JSON output to :py:class:`Token` objects,
+    interning strings and analyses.
+
+    Strings are interned with :py:func:`sys.intern`, so they are freed with
+    the last token using them. Analyses, and strings on Python 2, are kept
+    in tables which are cleared when they reach `max_entries` entries.
+
+    :param  max_entries: limit of the number of entries of a table
+    :type   max_entries: int
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._strings = {}
+        self._analyses = {}
+        if _intern is not None:
+            self.string = _intern
+
+    def string(self, s):
+        strings = self._strings
+        interned = strings.get(s)
+        if interned is None:
+            if len(strings) >= self.max_entries:
+                strings.clear()
+            interned = strings[s] = s
+        return interned
+
+    def analysis(self, a):
+        key = (a.get('lex'), a.get('gr'), a.get('qual'), a.get('wt'))
+        analysis = self._analyses.get(key)
+        if analysis is None:
+            if len(self._analyses) >= self.max_entries:
+                self._analyses.clear()
+            lex, gr, qual, wt = key
+            string = self.string
+            analysis = Analysis(string(lex), gr and string(gr), qual and string(qual), wt)
+            self._analyses[key] = analysis
+        return analysis
+
+    def tokens(self, obj):
+        string = self.string
+        analysis = self.analysis
+        tokens = []
+        for token in obj:
+            hypotheses = token.get('analysis')
+            if hypotheses is not None:
+                hypotheses = tuple([analysis(a) for a in hypotheses])
+            tokens.append(Token(string(token['text']), hypotheses))
+        return tokens
+
+    def clear(self):
+        """ Forget shared analyses and strings; tokens made before keep theirs. """
+        self._strings.clear()
+        self._analyses.clear()
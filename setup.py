@@ -38,7 +38,9 @@ sys.path.append('.')
 CODE_DIRECTORY = 'pymystem3'
 DOCS_DIRECTORY = 'docs'
 TESTS_DIRECTORY = 'tests'
+BENCHMARKS_DIRECTORY = 'benchmarks'
 PYTEST_FLAGS = ['--doctest-modules']
+PY3_ONLY_FILES = [os.path.join(CODE_DIRECTORY, 'aio.py')]
 
 # Import metadata. Normally this would just be:
 #
@@ -164,6 +166,10 @@ def _lint():
     #   to pass a byte string to endswith.
     project_python_files = [filename for filename in get_project_files()
                             if filename.endswith(b'.py')]
+    if sys.version_info[0] < 3:
+        # asyncio client can not be even parsed by Python 2.
+        project_python_files = [filename for filename in project_python_files
+                                if filename not in PY3_ONLY_FILES]
     retcode = subprocess.call(
         ['flake8', '--max-complexity=15', '--ignore=E265', '--max-line-length=140'] + project_python_files)
     if retcode == 0:
@@ -244,7 +250,7 @@ setup_dict = dict(
         'Topic :: Scientific/Engineering',
         'Topic :: Scientific/Engineering :: Information Analysis',
     ],
-    packages=find_packages(exclude=(TESTS_DIRECTORY,)),
+    packages=find_packages(exclude=(TESTS_DIRECTORY, BENCHMARKS_DIRECTORY)),
     install_requires=[
         'requests',
     ] + python_version_specific_requires,
@@ -255,6 +261,9 @@ setup_dict = dict(
         'flake8>=2.1.0',
     ],
     cmdclass={'test': TestAllCommand},
+    entry_points={
+        'console_scripts': ['pymystem3 = pymystem3.__main__:main'],
+    },
     zip_safe=False,  # don't use eggs
     use_2to3=True,
 )
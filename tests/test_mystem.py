@@ -1,6 +1,20 @@
 # -*- coding: utf-8 -*-
 
-from pymystem3 import Mystem
+import json
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+from pymystem3 import (DiskCache, Lemmatizer, LRUCache, Mystem, MystemMetrics, MystemPool,
+                       analyze_file_parallel, shared_process_stats)
+from pymystem3.metrics import Histogram
+from pymystem3.__main__ import main
+from pymystem3.mystem import _OutputBuffer
+from pymystem3.server import MystemClient, MystemServer
+from pymystem3.tokens import _TokenFactory
 
 
 class TestMystem(object):
@@ -18,3 +32,441 @@ class TestMystem(object):
         m = Mystem()
         tokens = m.lemmatize("ABC")
         assert ["ABC", "\n"] == tokens
+
+    def test_mystem_multiline(self):
+        m = Mystem()
+        tokens = m.lemmatize("Мама мыла раму\nABC\n\nраму")
+        assert ["мама", " ", "мыть", " ", "рама", "\n", "ABC", "\n", "\n", "рама", "\n"] == tokens
+
+    def test_mystem_iter_lemmatize(self):
+        m = Mystem()
+        lines = (line for line in ["Мама мыла раму\n", "ABC\n", "\n", "раму"] * 3)
+        tokens = list(m.iter_lemmatize(lines, max_inflight=2))
+        assert ["мама", " ", "мыть", " ", "рама", "\n", "ABC", "\n", "\n", "рама", "\n"] * 3 == tokens
+
+    def test_mystem_iter_analyze_nested(self):
+        m = Mystem()
+        it = m.iter_analyze(["мама мыла"] * 5000)
+        next(it)
+        with pytest.raises(RuntimeError):
+            m.analyze("раму")
+        assert 19999 == len(list(it))
+        assert ["рама", "\n"] == m.lemmatize("раму")
+
+        it = m.iter_analyze(["мама"] * 5000)
+        next(it)
+        it.close()
+        assert ["рама", "\n"] == m.lemmatize("раму")
+
+    def test_mystem_max_inflight(self):
+        m = Mystem()
+        with pytest.raises(ValueError):
+            m.iter_analyze(["мама"], max_inflight=0)
+        with pytest.raises(ValueError):
+            Mystem(disambiguation=False, dedup_words=True).analyze_many(["мама", "раму"], max_inflight=0)
+        assert [["рама", "\n"]] == m.lemmatize_many(["раму"], max_inflight=1)
+
+    def test_mystem_huge_line(self):
+        m = Mystem()
+        lemmas = m.lemmatize("мама " * 100000)
+        assert 100000 == lemmas.count("мама")
+
+    def test_output_buffer(self):
+        output = _OutputBuffer(size=16)
+        assert [] == output.feed(b'[1,')
+        assert [b'[1,2]', b'[3]'] == [r.tobytes() for r in output.feed(b'2]\n\n[3]\n[')]
+        records = output.feed(b'4' * 100 + b']\n')
+        assert [b'[' + b'4' * 100 + b']'] == [r.tobytes() for r in records]
+        assert b'' == output.tail()
+
+    def test_mystem_file_path(self, tmpdir):
+        path = tmpdir.join("input.txt")
+        path.write_binary("Мама мыла раму\nABC\n".encode("utf-8"))
+        m = Mystem()
+        m.start()
+        proc = m._process.proc
+        tokens = m.lemmatize(file_path=str(path))
+        assert ["мама", " ", "мыть", " ", "рама", "\n", "ABC", "\n"] == tokens
+        assert ["ABC", "\n"] == m.lemmatize("ABC")
+        assert tokens == list(m.iter_lemmatize(file_path=str(path), max_inflight=1))
+        assert proc is m._process.proc
+
+    def test_mystem_analyze_many(self):
+        docs = ["Мама мыла раму\nABC", "", "раму\n\nмама", "ABC"]
+        m = Mystem()
+        assert [m.analyze(doc) for doc in docs] == m.analyze_many(docs, max_inflight=2)
+        assert [m.lemmatize(doc) for doc in docs] == m.lemmatize_many(iter(docs))
+
+    def test_mystem_threads(self):
+        m = Mystem()
+        texts = ["Мама мыла раму\nABC", "раму\n\nмама"] * 4
+        expected = [m.analyze(text) for text in texts]
+        results = [None] * len(texts)
+
+        def run(i):
+            for _ in range(20):
+                results[i] = m.analyze(texts[i])
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert expected == results
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+    def test_mystem_fork(self):
+        m = Mystem()
+        assert ["мама", "\n"] == m.lemmatize("мама")
+        parent_proc = m._process.proc
+
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                ok = m.lemmatize("раму") == ["рама", "\n"] and m._process.proc is not parent_proc
+                m.close()
+            finally:
+                os.write(wfd, b"1" if ok else b"0")
+                os._exit(0)
+        os.close(wfd)
+        os.waitpid(pid, 0)
+        assert b"1" == os.read(rfd, 1)
+        os.close(rfd)
+
+        assert m._process.proc is parent_proc
+        assert ["мыть", "\n"] == m.lemmatize("мыла")
+
+    def test_mystem_shared(self):
+        stats = shared_process_stats()
+        m1 = Mystem(shared=True)
+        m2 = Mystem(shared=True, compact_tokens=True)
+        assert ["мама", "\n"] == m1.lemmatize("мама")
+        assert ["рама", "\n"] == m2.lemmatize("раму")
+        assert m1._process is m2._process
+
+        m1.close()
+        assert ["мыть", "\n"] == m2.lemmatize("мыла")
+        after = shared_process_stats()
+        assert 1 == after['spawns'] - stats['spawns']
+        assert 1 == after['spawns_avoided'] - stats['spawns_avoided']
+
+        m2.close()
+        assert m2._process.proc is None
+
+    def test_mystem_prewarm(self):
+        m = Mystem(prewarm=True)
+        assert m.status()['running'] or m.status()['warming']
+        assert ["мама", "\n"] == m.lemmatize("мама")
+        status = m.status()
+        assert status['ready'] and status['startup_time'] >= 0
+        m.close()
+        assert not m.status()['running']
+
+    def test_mystem_dedup_words(self):
+        text = "Мама мыла раму, мама мыла раму.\nABC мама\n\nраму"
+        expected = Mystem(disambiguation=False).analyze(text)
+
+        m = Mystem(disambiguation=False, dedup_words=True)
+        assert expected == m.analyze(text)
+        assert set(["Мама", "мама", "мыла", "раму", "ABC"]) == set(m.vocabulary)
+        assert ["мама", " ", "мыть", " ", "рама", "\n"] == m.lemmatize("мама мыла раму")
+
+    def test_mystem_dedup_words_max_words(self):
+        docs = ["мама мыла", "раму ABC", "мама"]
+        expected = Mystem(disambiguation=False).analyze_many(docs)
+
+        m = Mystem(disambiguation=False, dedup_words=True, max_words=3)
+        assert expected == m.analyze_many(docs, max_inflight=1)
+        # cleared at the second doc, which did not fit
+        assert set(["раму", "ABC", "мама"]) == set(m.vocabulary)
+
+    def test_mystem_compact_tokens(self):
+        text = "Мама мыла раму\nABC"
+        expected = Mystem().analyze(text)
+
+        m = Mystem(compact_tokens=True)
+        tokens = m.analyze(text)
+        assert expected == [token.as_dict() for token in tokens]
+        assert tokens[0].analysis[0] is m.analyze("мама")[0].analysis[0]
+        assert ["мама", " ", "мыть", " ", "рама", "\n", "ABC", "\n"] == m.lemmatize(text)
+        assert [Mystem.get_pos(t) for t in expected] == [Mystem.get_pos(t) for t in tokens]
+        assert [Mystem.get_printable_repr(t) for t in expected] == [Mystem.get_printable_repr(t) for t in tokens]
+
+    def test_token_factory_bounded(self):
+        factory = _TokenFactory(max_entries=2)
+        tokens = factory.tokens([{'text': 'a', 'analysis': [{'lex': 'a'}]}, {'text': 'b', 'analysis': [{'lex': 'b'}]}])
+        assert tokens[0].analysis[0] is factory.analysis({'lex': 'a'})
+        factory.analysis({'lex': 'c'})
+        assert 1 == len(factory._analyses)
+        assert tokens[0].analysis[0] == factory.analysis({'lex': 'a'})
+        factory.clear()
+        assert not factory._analyses
+
+    def test_mystem_json_decoder(self):
+        text = "Мама мыла раму\nABC"
+        assert Mystem().analyze(text) == Mystem(json_decoder='json').analyze(text)
+        with pytest.raises(ValueError):
+            Mystem(json_decoder='yaml')
+
+    def test_mystem_instrument(self):
+        calls = []
+        m = Mystem(on_call=calls.append, cache=LRUCache(max_entries=10))
+        assert Mystem().stats() is None
+
+        m.analyze("Мама мыла раму\nABC")
+        m.lemmatize_many(["раму", "ABC"])
+        assert ['analyze', 'analyze_many'] == [call.method for call in calls]
+        assert (2, 8) == (calls[0].lines, calls[0].tokens)
+        assert 1 == calls[1].cache_hits
+        assert calls[0].bytes_out > calls[0].bytes_in == len("Мама мыла раму\nABC\n".encode("utf-8"))
+
+        stats = m.stats()
+        assert (2, 4, 1) == (stats['calls'], stats['lines'], stats['cache_hits'])
+        for name in ('write_time', 'wait_time', 'read_time', 'parse_time'):
+            assert 0 < stats[name] <= stats['total_time']
+
+
+class TestLemmatizer(object):
+    def test_lemmatizer(self):
+        texts = ["Мама мыла раму, ABC\n\n  раму", "", "мама"]
+        m = Mystem()
+        lemmatizer = Lemmatizer()
+        for text in texts:
+            assert m.lemmatize(text) == lemmatizer.lemmatize(text)
+        assert [m.lemmatize(text) for text in texts] == lemmatizer.lemmatize_many(texts)
+
+    def test_lemmatizer_braces(self):
+        texts = ["a {} b", "{ }", "f(x) = {x}", "мама {мыла} раму\nраму", "шаблон {{name}}"]
+        m = Mystem()
+        lemmatizer = Lemmatizer()
+        for text in texts:
+            assert m.lemmatize(text) == lemmatizer.lemmatize(text)
+        assert [m.lemmatize(text) for text in texts] == lemmatizer.lemmatize_many(texts)
+        lemmatizer.close()
+
+    def test_lemmatizer_options(self):
+        with pytest.raises(TypeError):
+            Lemmatizer(disambiguation=False, dedup_words=True)
+        with MystemPool(size=1, mystem_class=Lemmatizer) as pool:
+            assert ["рама", "\n"] == pool.lemmatize("раму")
+            with pytest.raises(TypeError):
+                pool.analyze("раму")
+
+
+class TestLRUCache(object):
+    def test_cache(self):
+        cache = LRUCache(max_entries=2)
+        m = Mystem(cache=cache)
+        tokens = m.analyze("Мама мыла раму\nABC\nМама мыла раму")
+        stats = cache.stats()
+        assert (0, 3, 2) == (stats['hits'], stats['misses'], stats['entries'])
+
+        tokens[0]['analysis'][0]['lex'] = 'папа'
+        assert tokens[6:] == m.analyze("ABC\nМама мыла раму")
+        assert ["мама", " ", "мыть", " ", "рама", "\n"] == m.lemmatize("Мама мыла раму")
+        assert 3 == cache.stats()['hits']
+
+        m.analyze("раму")
+        assert 1 == cache.stats()['evictions']
+
+
+class TestDiskCache(object):
+    def test_disk_cache(self, tmpdir):
+        path = str(tmpdir.join("cache.db"))
+        text = "Мама мыла раму\nABC\nраму"
+        expected = Mystem().analyze(text)
+
+        cache = DiskCache(path, max_entries=2, evict_every=1)
+        assert expected == Mystem(cache=cache).analyze(text)
+        assert (0, 3, 1) == tuple(cache.stats()[k] for k in ('hits', 'misses', 'evictions'))
+        cache.close()
+
+        cache = DiskCache(path, max_entries=2)
+        assert expected[-2:] == Mystem(cache=cache).analyze("раму")
+        assert 1 == cache.stats()['hits']
+        assert 2 == len(cache)
+
+    def test_disk_cache_atime(self, tmpdir):
+        path = str(tmpdir.join("cache.db"))
+        cache = DiskCache(path, atime_resolution=0)
+        key = (("mystem",), b"line")
+        cache.put(key, b"[]")
+        cache.get(key)
+        atime = cache._connect().execute("SELECT atime FROM lines").fetchone()[0]
+        assert 1 == len(cache._atimes)
+        cache.close()
+        assert atime < cache._connect().execute("SELECT atime FROM lines").fetchone()[0]
+
+        cache = DiskCache(path)
+        cache.get(key)
+        assert not cache._atimes
+
+
+class TestMetrics(object):
+    def test_histogram(self):
+        histogram = Histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.05, 0.5, 2.0):
+            histogram.observe(value)
+        assert 0.1 == histogram.quantile(0.5)
+        assert 1.0 == histogram.quantile(0.99)
+        assert ('latency_seconds_bucket{le="0.1"} 2\n'
+                'latency_seconds_bucket{le="1.0"} 3\n'
+                'latency_seconds_bucket{le="+Inf"} 4\n'
+                'latency_seconds_sum 2.6\n'
+                'latency_seconds_count 4\n') in histogram.render()
+
+    def test_mystem_metrics(self):
+        metrics = MystemMetrics()
+        m = Mystem(on_call=metrics)
+        m.analyze("Мама мыла раму\nABC")
+        m.lemmatize_many(["раму", "ABC"])
+
+        text = metrics.render()
+        assert '# TYPE mystem_call_duration_seconds histogram\n' in text
+        assert 'mystem_call_duration_seconds_count{method="analyze_many"} 1\n' in text
+        assert 'mystem_lines_total 4\n' in text
+        values = metrics.as_dict()
+        assert {'analyze': 1, 'analyze_many': 1} == values['mystem_calls_total']
+        assert values['mystem_call_duration_seconds']['analyze']['p99'] > 0
+        assert values['tokens_per_second'] > 0
+
+
+class TestMystemPool(object):
+    def test_pool(self):
+        with MystemPool(size=2) as pool:
+            tokens = pool.lemmatize("Мама мыла раму\nABC\n\nраму\n\n")
+        assert ["мама", " ", "мыть", " ", "рама", "\n", "ABC", "\n", "\n", "рама", "\n", "\n"] == tokens
+
+    def test_pool_bad_mystem_bin(self, tmpdir):
+        with pytest.raises(OSError):
+            MystemPool(size=2, mystem_bin=str(tmpdir.join("nonexistent")))
+
+    def test_pool_bad_size(self):
+        with pytest.raises(ValueError):
+            MystemPool(size=0)
+        # what __del__ does with a pool whose __init__ has failed
+        MystemPool.__new__(MystemPool).close()
+
+
+class TestAnalyzeFileParallel(object):
+    def test_analyze_file_parallel(self, tmpdir):
+        text = "Мама мыла раму\nABC\n\nраму\n" * 50
+        path = tmpdir.join("input.txt")
+        path.write_binary(text.encode("utf-8"))
+
+        expected = Mystem().analyze(text)
+        assert expected == list(analyze_file_parallel(str(path), workers=3, shard_size=100))
+
+        shards = []
+        with MystemPool(size=2) as pool:
+            assert len(expected) == pool.lemmatize_file(str(path), sink=shards.append, shard_size=100)
+        assert Mystem().lemmatize(text) == [lemma for shard in shards for lemma in shard]
+        assert len(shards) > 2
+
+    def test_analyze_file_parallel_line_breaks(self, tmpdir):
+        path = tmpdir.join("input.txt")
+        path.write_binary("мама\rраму\nABC\x0cмыла\r\n\x0b\nраму".encode("utf-8"))
+
+        m = Mystem()
+        assert m.analyze(file_path=str(path)) == list(analyze_file_parallel(str(path), workers=2, shard_size=1))
+        with MystemPool(size=2) as pool:
+            assert m.lemmatize(file_path=str(path)) == list(pool.lemmatize_file(str(path), shard_size=4))
+            with pytest.raises(ValueError):
+                pool.analyze_file(str(path), sink=len, shard_size=0)
+
+
+class TestMystemServer(object):
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="requires Unix sockets")
+    def test_server(self, tmpdir):
+        path = str(tmpdir.join("mystem.sock"))
+        server = MystemServer(path, size=2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with MystemClient(path) as client:
+                assert ["мама", " ", "мыть", "\n"] == client.lemmatize("мама мыла")
+                assert Mystem().analyze("раму") == client.analyze("раму")
+                docs = ["Мама мыла раму", "", "ABC"]
+                assert [Mystem().lemmatize(doc) for doc in docs] == client.lemmatize_many(docs, batch_size=1)
+                with pytest.raises(RuntimeError):
+                    client.call_many([("unknown", {})])
+                stats = client.stats()
+                assert (6, 1) == (stats['requests'], stats['errors'])
+
+                with pytest.raises(RuntimeError):
+                    client.call_many([("lemmatize", {"text": "мама"}), ("unknown", {}), ("lemmatize", {"text": "раму"})])
+                assert ["рама", "\n"] == client.lemmatize("раму")
+                client.close()
+                assert ["мама", "\n"] == client.lemmatize("мама")
+        finally:
+            server.shutdown()
+            thread.join()
+            server.close()
+
+
+class TestMain(object):
+    def test_main(self, tmpdir, capfd):
+        tmpdir.join("a.txt").write_binary("Мама мыла раму\n\nABC\n".encode("utf-8"))
+        tmpdir.join("b.txt").write_binary("раму\n".encode("utf-8"))
+        pattern = str(tmpdir.join("*.txt"))
+
+        main(["--lemmas", "--jobs", "2", "--batch-size", "2", pattern])
+        out, err = capfd.readouterr()
+        assert "мама мыть рама\n\nABC\nрама\n" == out
+        assert err.startswith("4 lines")
+
+        main(["--quiet", str(tmpdir.join("b.txt"))])
+        out, err = capfd.readouterr()
+        assert [Mystem().analyze("раму")] == [json.loads(line) for line in out.splitlines()]
+        assert "" == err
+
+    def test_main_line_breaks(self, tmpdir, capfd):
+        tmpdir.join("a.txt").write_binary("мама\x0cраму\u2028ABC\n\x1c\n".encode("utf-8"))
+
+        for jobs in ("1", "2"):
+            main(["--quiet", "--lemmas", "--jobs", jobs, str(tmpdir.join("a.txt"))])
+            out, err = capfd.readouterr()
+            assert "мама\x0cрама\u2028ABC\n\x1c\n" == out
+
+        main(["--quiet", str(tmpdir.join("a.txt"))])
+        out, err = capfd.readouterr()
+        assert 2 == len(out.split("\n")) - 1
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5), reason="requires asyncio")
+class TestAsyncMystem(object):
+    def test_async_mystem(self):
+        import asyncio
+        from pymystem3 import AsyncMystem
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        m = AsyncMystem()
+        texts = ["Мама мыла раму", "ABC\nраму", ""] * 10
+        results = loop.run_until_complete(asyncio.gather(*[m.lemmatize(text) for text in texts]))
+        loop.run_until_complete(m.close())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+        assert [["мама", " ", "мыть", " ", "рама", "\n"], ["ABC", "\n", "рама", "\n"], []] * 10 == results
+
+    def test_async_mystem_cancel(self):
+        import asyncio
+        from pymystem3 import AsyncMystem
+
+        async def run(m):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(m.lemmatize("мама\n" * 200000), 0.01)
+            return await m.lemmatize("раму")
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        m = AsyncMystem()
+        result = loop.run_until_complete(run(m))
+        loop.run_until_complete(m.close())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+        assert ["рама", "\n"] == result